@@ -1595,24 +1595,16 @@ class MainWindow(QMainWindow):
         return vtk_image
 
     def itk_to_vtk_image(self, itk_image):
+        # 与 ITK 图像共享像素缓冲区，不再 AllocateScalars 后整体深拷贝
         itk_array = itk.GetArrayViewFromImage(itk_image)
         vtk_image = vtk.vtkImageData()
 
-        # 交换 X 和 Y 轴
-       # itk_array = np.swapaxes(itk_array, 1, 2)
-
         depth, height, width = itk_array.shape
 
         vtk_image.SetDimensions(width, height, depth)
-        vtk_image.AllocateScalars(vtk.VTK_SHORT, 1)
 
-        vtk_data_array = numpy_support.numpy_to_vtk(itk_array.ravel(), deep=True, array_type=vtk.VTK_SHORT)
-        '''
-        data_array_x = vtk_data_array[1]
-        data_array_y = vtk_data_array[0]
-        vtk_data_array[0] = data_array_x
-        vtk_data_array[1] = data_array_y
-        '''
+        vtk_data_array = numpy_support.numpy_to_vtk(itk_array.reshape(-1), deep=False, array_type=vtk.VTK_SHORT)
+        vtk_data_array._owner = itk_image  # 保证 ITK 图像与 VTK 数据同生命周期
         vtk_image.GetPointData().SetScalars(vtk_data_array)
 
         return vtk_image
@@ -0,0 +1,403 @@
+"""
+性能对比脚本，直接调用 test.py 中的加载代码，不启动界面。
+
+    python benchmark.py decode <DICOM 文件夹或文件...> [--repeat 3] [--processes N]
+    python benchmark.py reslice <DICOM 文件夹或文件...> [--threads 1 2 4 8] [--frames 20]
+    python benchmark.py events <DICOM 文件夹或文件...> [--clicks 50]
+    python benchmark.py observers <DICOM 文件夹或文件...> [--reopens 5]
+    python benchmark.py bindings [--reopens 5]
+    python benchmark.py pyramid
+
+decode：对比 ITK/GDCM 逐张读取、多线程 pydicom 解码、多进程批量解码（仅压缩序列）的耗时，并检查结果是否一致。
+reslice：按不同线程数旋转三视图（reslice + 窗宽窗位映射各一张切片），对比三个视图依次更新与同时更新的每帧耗时，
+         同时更新明显更快时再打开 test.py 中的 CONCURRENT_VIEW_UPDATES。
+events：打开界面并加载序列，在三个二维视图中模拟各工具模式下的左键点击，统计每次事件的处理耗时。
+observers：重复打开同一序列若干次后，在各视图上各触发一次鼠标事件，检查每个处理函数只被调用一次。
+bindings：不需要数据与 GPU，用合成体数据反复打开序列再清空视图，检查 InteractionBindings 中的 observer 数量不变。
+pyramid：用合成体数据（尺寸不能被层级整除）检查各金字塔层级的视图 reslice 输出与原分辨率在同一层号上一致，不需要数据与 GPU。
+"""
+import argparse
+import glob
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PySide6.QtWidgets import QApplication, QWidget
+
+import test
+
+
+def expand_paths(paths):
+    filenames = []
+    for path in paths:
+        if os.path.isdir(path):
+            filenames.extend(sorted(glob.glob(os.path.join(path, "*.dcm"))))
+        else:
+            filenames.append(path)
+    return filenames
+
+
+def timed(function, repeat):
+    # 返回最快一次的耗时与最后一次的结果
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def load_with(filenames, processes):
+    test.DECODE_PROCESSES = processes
+    return test.VolumeLoader(filenames).load()[1]
+
+
+def benchmark_decode(filenames, repeat, processes):
+    series = test.scan_dicom_series(filenames, test.LOAD_WORKERS)
+    compressed = series.transfer_syntax_uid in test.COMPRESSED_SYNTAXES
+    print(f"{len(series.filenames)} slices, {series.rows} x {series.columns}, "
+          f"transfer syntax {series.transfer_syntax_uid} ({'compressed' if compressed else 'uncompressed'})")
+
+    gdcm_time, reference = timed(lambda: np.array(test.read_dicom_itk(series.filenames)), repeat)
+    print(f"GDCM (ITK)            {gdcm_time:8.3f} s")
+
+    thread_time, volume = timed(lambda: load_with(series.filenames, 1), repeat)
+    print(f"threads x{test.LOAD_WORKERS:<2}           {thread_time:8.3f} s  "
+          f"x{gdcm_time / thread_time:.2f}  identical: {np.array_equal(volume, reference)}")
+
+    if compressed and processes > 1:
+        test.DECODE_PROCESSES = processes
+        test.get_decode_pool().submit(int).result()  # 进程启动不计入解码时间
+        process_time, volume = timed(lambda: load_with(series.filenames, processes), repeat)
+        print(f"processes x{processes:<2}         {process_time:8.3f} s  "
+              f"x{gdcm_time / process_time:.2f}  identical: {np.array_equal(volume, reference)}")
+        test.decode_pool.shutdown()
+
+
+def view_pipelines(vtk_image, axes, threads):
+    # 与界面中相同的三视图管线：每个视图一个 reslice 和一个窗宽窗位映射，各自只计算中间的一张切片
+    width, height, depth = vtk_image.GetDimensions()
+    slices = [(0, width - 1, 0, height - 1, depth // 2, depth // 2),
+              (0, width - 1, height // 2, height // 2, 0, depth - 1),
+              (width // 2, width // 2, 0, height - 1, 0, depth - 1)]
+    pipelines = []
+    for extent in slices:
+        reslice = test.threaded(test.vtk.vtkImageReslice(), threads)
+        reslice.SetInputData(test.pipeline_input(vtk_image))
+        reslice.SetResliceAxes(axes)
+        reslice.SetInterpolationModeToLinear()
+        reslice.SetOutputExtent(0, width - 1, 0, height - 1, 0, depth - 1)
+        window_level = test.threaded(test.vtk.vtkImageMapToWindowLevelColors(), threads)
+        window_level.SetInputConnection(reslice.GetOutputPort())
+        window_level.SetWindow(2000)
+        window_level.SetLevel(-300)
+        pipelines.append((window_level, extent))
+    return pipelines
+
+
+def benchmark_reslice(filenames, thread_counts, frames):
+    series, volume = test.VolumeLoader(filenames).load()
+    vtk_image = test.numpy_to_vtk_image(volume)
+    center = vtk_image.GetCenter()
+    print(f"{series.frames} x {series.rows} x {series.columns}, {os.cpu_count()} CPUs")
+
+    baseline = None
+    for threads in thread_counts:
+        test.configure_render_threads(threads)
+        transform = test.vtk.vtkTransform()
+        pipelines = view_pipelines(vtk_image, transform.GetMatrix(), threads)
+
+        def rotate(frame):
+            transform.Identity()
+            transform.Translate(center)
+            transform.RotateX(frame * 3 + 1)
+            transform.RotateZ(frame * 2 + 1)
+            transform.Translate(-center[0], -center[1], -center[2])
+            transform.Update()  # 更新 reslice 引用的矩阵
+
+        def serial():
+            for frame in range(frames):
+                rotate(frame)
+                for window_level, extent in pipelines:
+                    window_level.UpdateExtent(extent)
+
+        def concurrent():
+            with ThreadPoolExecutor(max_workers=len(pipelines)) as executor:
+                for frame in range(frames):
+                    rotate(frame)
+                    futures = [executor.submit(window_level.UpdateExtent, extent) for window_level, extent in pipelines]
+                    for future in futures:
+                        future.result()
+
+        serial_time, _ = timed(serial, 1)
+        concurrent_time, _ = timed(concurrent, 1)
+        if baseline is None:
+            baseline = serial_time
+        print(f"threads {threads:<3} (SMP {test.vtk.vtkSMPTools.GetEstimatedNumberOfThreads():<3})  "
+              f"one view at a time {serial_time / frames * 1000:7.1f} ms/frame  x{baseline / serial_time:.2f}   "
+              f"views together {concurrent_time / frames * 1000:7.1f} ms/frame  x{baseline / concurrent_time:.2f}")
+
+
+def wait_for_load(window):
+    app = QApplication.instance()
+    while window.loading_viewer is not None or window.load_queue:
+        app.processEvents()
+        time.sleep(0.005)
+    app.processEvents()
+
+
+def benchmark_events(filenames, clicks):
+    app = QApplication.instance() or QApplication([])
+    window = test.MainWindow()
+    window.show()
+    window.load_in_background(filenames)
+    wait_for_load(window)
+
+    def reset():
+        for flag in ("picking", "measuring", "measuring_angle", "measuring_horizontal_angle", "erasing"):
+            setattr(window, flag, False)
+
+    def restart(flag, start):
+        # 测距点两下、测角点三下（水平角两下）后会自己关闭，关闭后重新开始
+        def prepare():
+            if not getattr(window, flag):
+                reset()
+                start()
+        return prepare
+
+    # 工具模式 -> 每次点击前的设置
+    modes = {"crosshair": reset,
+             "pick": lambda: (reset(), setattr(window, "picking", True)),
+             "measure": restart("measuring", window.measure_two_points),
+             "angle": restart("measuring_angle", window.measure_one_angle),
+             "h_angle": restart("measuring_horizontal_angle", window.measure_angle_horizontal),
+             "erase": lambda: (reset(), setattr(window, "erasing", True))}
+    rng = np.random.default_rng(0)
+    for mode, prepare in modes.items():
+        for dispatcher in window.tool_dispatchers:
+            dispatcher.latency.clear()
+        for _ in range(clicks):
+            for interactor in window.slice_views:
+                prepare()
+                width, height = interactor.GetRenderWindow().GetSize()
+                interactor.SetEventPosition(int(rng.uniform(0.3, 0.7) * width), int(rng.uniform(0.3, 0.7) * height))
+                interactor.InvokeEvent("LeftButtonPressEvent")
+            app.processEvents()
+        count = total = longest = 0
+        for dispatcher in window.tool_dispatchers:
+            for handler_count, handler_total, handler_longest in dispatcher.latency.values():
+                count += handler_count
+                total += handler_total
+                longest = max(longest, handler_longest)
+        print(f"{mode:<10} {count:5d} clicks  mean {total / max(count, 1) * 1000:7.3f} ms  max {longest * 1000:7.3f} ms")
+    window.close()
+
+
+# 交互器上绑定的处理函数；检查时换成只计数的版本，不执行实际操作（如弹出右键菜单）
+OBSERVED_HANDLERS = ("left_button_tool", "on_mouse_move", "on_left_button_release", "on_right_button_press_zoom",
+                     "on_mouse_move_zoom", "on_right_button_release_zoom", "show_minimenu", "projection_back")
+
+
+def check_observers(filenames, reopens):
+    calls = {}
+
+    class CountingWindow(test.MainWindow):
+        pass
+
+    for name in OBSERVED_HANDLERS:
+        def handler(self, *args, name=name):
+            calls[name] = calls.get(name, 0) + 1
+        setattr(CountingWindow, name, handler)
+
+    app = QApplication.instance() or QApplication([])
+    window = CountingWindow()
+    window.show()
+    window.load_in_background(filenames)
+    wait_for_load(window)
+    for _ in range(reopens):
+        window.visualize_vtk_image(window.dicom_viewers[window.current_viewer_index].vtk_image)
+        app.processEvents()
+
+    events = ("LeftButtonPressEvent", "LeftButtonReleaseEvent", "MouseMoveEvent", "RightButtonPressEvent", "RightButtonReleaseEvent")
+    interactors = list(window.slice_views) + [window.render_window_interactor_3d]
+    passed = True
+    print(f"after {reopens} reopens, one event per view:")
+    for event in events:
+        calls.clear()
+        for interactor in interactors:
+            interactor.InvokeEvent(event)
+        counts = "  ".join(f"{name} x{count}" for name, count in sorted(calls.items()))
+        # 三个二维视图各调用一次；3D 视图只有左键的 projection_back
+        expected = all(count == (1 if name == "projection_back" else 3) for name, count in calls.items())
+        passed = passed and expected
+        print(f"{event:<24} {counts or '-'}  {'ok' if expected else 'DUPLICATED'}")
+    print("PASS" if passed else "FAIL")
+    window.close()
+    return passed
+
+
+class HeadlessView(QWidget):
+    """
+    代替 QVTKRenderWindowInteractor 的视图控件：渲染窗口不创建 OpenGL 上下文，Render 直接返回，
+    交互器照常注册 observer、分发事件，检查交互绑定时不需要 GPU。
+    """
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.render_window = test.vtk.vtkGenericOpenGLRenderWindow()
+        self.render_window.SetReadyForRendering(False)
+        self.render_window.SetSize(400, 400)
+        self.interactor = test.vtk.vtkGenericRenderWindowInteractor()
+        self.render_window.SetInteractor(self.interactor)
+
+    def GetRenderWindow(self):
+        return self.render_window
+
+    def Initialize(self):
+        self.interactor.Initialize()
+
+    def Start(self):
+        pass
+
+
+def synthetic_series(shape):
+    # 轴位、各向同性 1 mm 的合成序列头信息，不对应任何文件
+    depth, rows, columns = shape
+    return test.DicomSeries([], "synthetic", "synthetic", "synthetic", None, rows, columns, depth,
+                            [1, 0, 0, 0, 1, 0], [0, 0, 0], [1, 1], 1, 1, True)
+
+
+def check_bindings(reopens):
+    # 没有显示器时用 Qt 的 offscreen 平台；vtkResliceImageViewer 构造时自带的默认渲染窗口会尝试连接 X 服务器，只是警告
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    test.vtk.vtkObject.GlobalWarningDisplayOff()
+    test.vtk.vtkLogger.SetStderrVerbosity(test.vtk.vtkLogger.VERBOSITY_ERROR)
+    app = QApplication.instance() or QApplication([])
+    test.QVTKRenderWindowInteractor = HeadlessView
+    window = test.MainWindow()
+    series = synthetic_series((40, 64, 64))
+    volume = np.zeros(series.shape, dtype=np.int16)
+    counts = []
+    for _ in range(reopens):
+        # 打开一个新序列，再像移除最后一个序列时那样清空视图
+        dcm = test.DICOMViewer()
+        dcm.attach_volume(series, volume)
+        window.dicom_viewers.append(dcm)
+        window.show_viewer(dcm)
+        window.render_scheduler.flush()
+        app.processEvents()
+        counts.append(len(window.bindings.tags))
+        window.dicom_viewers.remove(dcm)
+        window.volume_manager.forget(dcm)
+        window.current_viewer_index = None
+        window.blank_views()
+        window.render_scheduler.flush()
+        app.processEvents()
+    passed = len(set(counts)) == 1
+    print(f"observer tags after each of {reopens} opens: {counts}")
+    print("PASS" if passed else "FAIL")
+    window.close()
+    return passed
+
+
+def view_slices(image, transform, dimensions, sampling):
+    # 与界面中的轴位视图相同的 reslice：切片平面内的输出间距为 sampling，返回 (z, y, x) 的全部切片
+    reslice = test.vtk.vtkImageReslice()
+    reslice.SetInputData(test.pipeline_input(image))
+    reslice.SetResliceAxes(transform.vtk_matrix)
+    reslice.SetInterpolationModeToLinear()
+    test.set_reslice_output(reslice, dimensions, (sampling, sampling, 1))
+    reslice.Update()
+    output = reslice.GetOutput()
+    width, height, depth = output.GetDimensions()
+    slices = test.numpy_support.vtk_to_numpy(output.GetPointData().GetScalars()).reshape(depth, height, width)
+    return output.GetOrigin(), slices.astype(np.int32)
+
+
+def check_pyramid(shapes, angles):
+    """
+    体数据的值随 z、y、x 线性变化，块平均与线性插值都不改变它，各层级在同一层号、同一显示坐标上应得到与原分辨率相同的值，
+    只有靠近边界的体素因最后一块不完整或超出最外层体素中心而略有差别。
+    层号或平面内错开一个体素时整层相差 10（z）、4（y）、2（x），末尾切片丢失时为背景 0。
+    """
+    passed = True
+    for shape in shapes:
+        z, y, x = np.indices(shape)
+        volume = (10 * z + 4 * y + 2 * x + 100).astype(np.int16)
+        pyramid = test.VolumePyramid(volume)
+        dimensions = shape[::-1]
+        transform = test.ViewTransform(test.vtk.vtkMatrix4x4(), [(n - 1) / 2 for n in dimensions])
+        for rotation in angles:
+            for axis, angle in enumerate(rotation):
+                transform.set_angle(axis, angle)
+            transform.update()
+            factor = 2
+            while factor <= pyramid.max_factor:
+                origin, expected = view_slices(test.numpy_to_vtk_image(volume), transform, dimensions, factor)
+                level_origin, actual = view_slices(pyramid.level(factor), transform, dimensions, factor)
+                inside = expected > 0  # 原分辨率在体数据范围内的点
+                difference = np.abs(actual - expected)
+                # 离两端超过一个层级体素的每一层：范围内的点中位差不超过取整误差；
+                # 所有层（包括末尾不完整的块）：最大差不超过一个层级体素内的变化量
+                worst = max(np.median(difference[k][inside[k]]) if inside[k].any() else 0
+                            for k in range(factor, len(expected) - factor))
+                largest = difference[inside].max()
+                ok = level_origin == origin and worst <= 1 and largest <= 16 * factor
+                passed = passed and ok
+                print(f"{str(shape):<16} angles {str(rotation):<14} factor {factor}  origin {level_origin}  "
+                      f"worst slice median {worst:5.1f}  max {largest:5d}  {'ok' if ok else 'MISMATCH'}")
+                factor *= 2
+    print("PASS" if passed else "FAIL")
+    return passed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CBCT viewer benchmarks")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    decode_parser = subparsers.add_parser("decode", help="DICOM decode backends")
+    decode_parser.add_argument("paths", nargs="+")
+    decode_parser.add_argument("--repeat", type=int, default=3)
+    decode_parser.add_argument("--processes", type=int, default=test.DECODE_PROCESSES)
+
+    reslice_parser = subparsers.add_parser("reslice", help="threaded 2D view updates")
+    reslice_parser.add_argument("paths", nargs="+")
+    reslice_parser.add_argument("--threads", type=int, nargs="+",
+                                default=sorted({1, 2, 4, 8, test.RENDER_THREADS}))
+    reslice_parser.add_argument("--frames", type=int, default=20)
+
+    events_parser = subparsers.add_parser("events", help="2D view mouse event latency")
+    events_parser.add_argument("paths", nargs="+")
+    events_parser.add_argument("--clicks", type=int, default=50)
+
+    observers_parser = subparsers.add_parser("observers", help="observer callbacks per event after reopening")
+    observers_parser.add_argument("paths", nargs="+")
+    observers_parser.add_argument("--reopens", type=int, default=5)
+
+    bindings_parser = subparsers.add_parser("bindings", help="observer tags after reopening, no data or GPU")
+    bindings_parser.add_argument("--reopens", type=int, default=5)
+
+    subparsers.add_parser("pyramid", help="pyramid levels against full resolution, synthetic data")
+
+    args = parser.parse_args()
+    if args.command == "decode":
+        benchmark_decode(expand_paths(args.paths), args.repeat, args.processes)
+    elif args.command == "reslice":
+        benchmark_reslice(expand_paths(args.paths), args.threads, args.frames)
+    elif args.command == "events":
+        benchmark_events(expand_paths(args.paths), args.clicks)
+    elif args.command == "observers":
+        if not check_observers(expand_paths(args.paths), args.reopens):
+            raise SystemExit(1)
+    elif args.command == "bindings":
+        if not check_bindings(args.reopens):
+            raise SystemExit(1)
+    elif args.command == "pyramid":
+        if not check_pyramid(((130, 250, 250), (37, 101, 99)), ((0, 0, 0), (15, -20, 30))):
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -10,6 +10,12 @@ pyinstaller -F --windowed --add-data "D:\DProgram_Files\Anaconda3\envs\CBCT\Lib\
             --add-data "D:\DProgram_Files\Anaconda3\envs\CBCT\Lib\site-packages\pandas;pandas" ^
             --hidden-import pydicom.encoders.gdcm ^
             --hidden-import pydicom.encoders.pylibjpeg ^
+            --hidden-import pydicom.pixels.decoders.pylibjpeg ^
+            --hidden-import pydicom.pixels.decoders.gdcm ^
+            --collect-all openjpeg ^
+            --collect-all libjpeg ^
+            --copy-metadata pylibjpeg-openjpeg ^
+            --copy-metadata pylibjpeg-libjpeg ^
             --hidden-import vtkmodules.util.data_model ^
             --hidden-import vtkmodules.all ^
             --collect-all vtkmodules test.py
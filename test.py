@@ -1,17 +1,53 @@
 import sys
+import os
+import json
+import time
+import multiprocessing
+import hashlib
+import sqlite3
+import struct
+import threading
+import itertools
+import functools
 import vtkmodules.all as vtk
 from PySide6.QtWidgets import QApplication, QMainWindow, QVBoxLayout, QHBoxLayout, QWidget, QSpinBox, QDial, QLabel, QMenuBar, QFileDialog, QGridLayout
 from PySide6.QtWidgets import QLineEdit, QPushButton, QMessageBox,  QTableWidget, QTableWidgetItem, QDialog, QVBoxLayout, QTextEdit, QMenu, QSlider, QDoubleSpinBox
-from PySide6.QtCore import Qt, QTimer
+from PySide6.QtWidgets import QProgressBar
+from PySide6.QtCore import Qt, QTimer, QObject, Signal, QEvent
 from PySide6.QtGui import QImage, QPainter, QRegion, QMouseEvent, QPixmap, QPen, QCursor
 from vtkmodules.qt.QVTKRenderWindowInteractor import QVTKRenderWindowInteractor
 import pydicom
+from pydicom.errors import InvalidDicomError
+from pydicom.fileset import FileSet
+from pydicom.uid import JPEGTransferSyntaxes, JPEGLSTransferSyntaxes, JPEG2000TransferSyntaxes
 import numpy as np
 from vtkmodules.util import numpy_support
 import itk
 from vtkmodules.vtkInteractionStyle import vtkInteractorStyleTrackballCamera
 import pandas as pd
 from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+
+
+LOAD_WORKERS = min(16, os.cpu_count() or 1)  # 后台加载时并行读头信息、解码切片的线程数
+VOLUME_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cbct_viewer", "volume_cache")  # 体数据磁盘缓存目录
+VOLUME_CACHE_BUDGET = 20 * 1024 ** 3  # 体数据磁盘缓存上限（字节），超出后按最近使用时间淘汰
+VOLUME_MEMORY_BUDGET = 4 * 1024 ** 3  # 已打开序列常驻内存的体数据上限（字节），超出后把最久未用的换出到磁盘
+STREAM_LOADING = True  # 多文件序列是否流式加载（先显示中间切片，其余在后台补齐）
+STREAM_SLAB = 8  # 流式加载时每个解码任务负责的切片数
+DECODE_PROCESSES = min(16, os.cpu_count() or 1)  # 压缩序列（JPEG / JPEG-LS / JPEG 2000）的解码进程数，<= 1 时仍用线程解码
+ROTATE_PREVIEW_SHRINK = 2  # 拖动旋转角度时切片平面内的降采样倍数（最近邻插值），停下后恢复原分辨率
+ROTATE_REFINE_DELAY = 200  # 旋转角度停止变化多少毫秒后按原分辨率、线性插值重新计算
+RENDER_THREADS = min(16, os.cpu_count() or 1)  # 2D 视图 reslice 与窗宽窗位映射的线程数
+CONCURRENT_VIEW_UPDATES = False  # 三个视图的管线是否在线程池中同时更新；默认依次更新，benchmark.py reslice 在多核上测出收益后再打开
+PYRAMID_MAX_FACTOR = 8  # 多分辨率金字塔的最大降采样倍数（2x、4x、8x）
+PYRAMID_MEMORY_BUDGET = 512 * 1024 ** 2  # 每个序列金字塔各级合计的内存上限（字节），放不下的层级不生成
+VOLUME_LOD_VOXELS = 128 ** 3  # 3D 视图旋转、缩放时改用的低分辨率体数据的体素数上限
+RENDER_MAX_FPS = 60  # 各视图每秒最多重绘次数，同一帧内的多次绘制请求合并为一次
+ANNOTATION_GRID_CELL = 16  # 标注空间索引的网格边长（体素），擦除等半径查询只检查覆盖到的格子
+CATALOG_PATH = os.path.join(os.path.expanduser("~"), ".cbct_viewer", "catalog.sqlite")  # 文件夹扫描得到的序列目录
 
 
 class MouseInteractorStyle(vtk.vtkInteractorStyleImage):
@@ -62,24 +98,1292 @@ class StateSnapshot:
         self.rotate_z = rotate_z
 
 
-def itk_to_vtk_image(itk_image):
-    itk_array = itk.GetArrayViewFromImage(itk_image)
+def numpy_to_vtk_image(array, spacing=(1, 1, 1), origin=(0, 0, 0), direction=None, owner=None):
+    """
+    将 (z, y, x) 排列的 int16 数组零拷贝地包装为 vtkImageData。
+    VTK 直接引用 array 的内存，不再 AllocateScalars 后整体深拷贝一次；
+    owner 为真正持有内存的对象（如 ITK 图像），挂在数据数组上保证其与 VTK 数据同生命周期。
+    """
+    array = np.ascontiguousarray(array, dtype=np.int16)  # 已连续时不会产生拷贝
+    depth, height, width = array.shape
+
     vtk_image = vtk.vtkImageData()
-    depth, height, width = itk_array.shape
     vtk_image.SetDimensions(width, height, depth)
-    vtk_image.AllocateScalars(vtk.VTK_SHORT, 1)
-    vtk_data_array = numpy_support.numpy_to_vtk(itk_array.ravel(), deep=True, array_type=vtk.VTK_SHORT)
+    vtk_image.SetSpacing(*spacing)
+    vtk_image.SetOrigin(*origin)
+    if direction is not None:
+        vtk_image.SetDirectionMatrix(tuple(np.asarray(direction, dtype=float).ravel()))
+
+    vtk_data_array = numpy_support.numpy_to_vtk(array.reshape(-1), deep=False, array_type=vtk.VTK_SHORT)
+    vtk_data_array._owner = owner  # numpy_to_vtk 只保留了 numpy 视图，这里再显式持有底层缓冲区的主人
     vtk_image.GetPointData().SetScalars(vtk_data_array)
 
     return vtk_image
 
 
+# 显示坐标 x、y、z 轴在病人坐标系（LPS）中的方向（按列）：x 指向左，y 指向前，z 指向足
+DISPLAY_DIRECTIONS = np.array([[1, 0, 0],
+                               [0, -1, 0],
+                               [0, 0, -1]], dtype=float)
+
+
+def display_orientation(direction, dimensions):
+    """
+    由序列方向余弦（体素索引各轴在 LPS 中的方向，按列）求出最接近 DISPLAY_DIRECTIONS 的带符号轴置换。
+    返回 (显示坐标 -> 体素索引的 4x4 矩阵，显示坐标下的尺寸)，矩阵直接用作 vtkImageReslice 的 ResliceAxes，
+    翻转绕体数据中心进行（i -> n - 1 - i），不需要拷贝体数据。
+    """
+    alignment = DISPLAY_DIRECTIONS.T @ np.asarray(direction, dtype=float)  # [显示轴, 索引轴] 的方向点积
+    axes = max(itertools.permutations(range(3)),
+               key=lambda permutation: sum(abs(alignment[a, b]) for a, b in enumerate(permutation)))
+    matrix = np.zeros((4, 4))
+    matrix[3, 3] = 1
+    for a, b in enumerate(axes):
+        if alignment[a, b] >= 0:
+            matrix[b, a] = 1
+        else:
+            matrix[b, a] = -1
+            matrix[b, 3] = dimensions[b] - 1
+    reslice_axes = vtk.vtkMatrix4x4()
+    reslice_axes.DeepCopy(matrix.ravel())
+    return reslice_axes, tuple(dimensions[b] for b in axes)
+
+
+def set_reslice_output(reslice, dimensions, spacing):
+    """
+    reslice 的输出固定在原分辨率的显示坐标系中：原点为 0，输出体素 k 在显示坐标 spacing * k 处，覆盖 0 到 n - 1。
+    不设原点时 VTK 让输出居中于输入的范围，输入换成尺寸不能整除的金字塔层级或放大输出间距后原点会偏移，层号与坐标都对不上。
+    """
+    reslice.SetOutputOrigin(0, 0, 0)
+    reslice.SetOutputSpacing(spacing)
+    reslice.SetOutputExtent([bound for n, step in zip(dimensions, spacing) for bound in (0, (n - 1) // step)])
+
+
+def configure_render_threads(threads):
+    """
+    设置 VTK 过滤器的多线程执行：SMP 后端优先用 STDThread（不可用时保留默认后端），线程数为 threads。
+    """
+    vtk.vtkSMPTools.SetBackend("STDThread")
+    vtk.vtkSMPTools.Initialize(threads)
+    vtk.vtkMultiThreader.SetGlobalDefaultNumberOfThreads(threads)
+
+
+def threaded(algorithm, threads=RENDER_THREADS):
+    # 图像过滤器把输出范围分块，用 SMP 线程并行计算
+    algorithm.SetEnableSMP(True)
+    algorithm.SetNumberOfThreads(threads)
+    return algorithm
+
+
+def pipeline_input(image):
+    # 同一份体数据给多个管线并发读取时，各自包一层浅拷贝（共用像素数组），避免共用同一个 trivial producer
+    wrapper = vtk.vtkImageData()
+    wrapper.ShallowCopy(image)
+    return wrapper
+
+
+def mirror_matrix(dimensions, axes):
+    """
+    绕体数据中心沿 axes 各轴镜像的 4x4 矩阵（i -> n - 1 - i）。
+    """
+    matrix = vtk.vtkMatrix4x4()
+    for axis in axes:
+        matrix.SetElement(axis, axis, -1)
+        matrix.SetElement(axis, 3, dimensions[axis] - 1)
+    return matrix
+
+
+@functools.lru_cache(maxsize=64)
+def euler_rotation(angle_x, angle_y, angle_z):
+    """
+    (Rx · Ry · Rz) 的转置，角度为度。同一组角度只计算一次，返回只读数组。
+    """
+    angle_x, angle_y, angle_z = np.radians([angle_x, angle_y, angle_z])
+    R_x = np.array([
+        [1, 0, 0],
+        [0, np.cos(angle_x), -np.sin(angle_x)],
+        [0, np.sin(angle_x), np.cos(angle_x)]
+    ])
+    R_y = np.array([
+        [np.cos(angle_y), 0, np.sin(angle_y)],
+        [0, 1, 0],
+        [-np.sin(angle_y), 0, np.cos(angle_y)]
+    ])
+    R_z = np.array([
+        [np.cos(angle_z), -np.sin(angle_z), 0],
+        [np.sin(angle_z), np.cos(angle_z), 0],
+        [0, 0, 1]
+    ])
+    R = (R_x @ R_y @ R_z).transpose()
+    R.setflags(write=False)
+    return R
+
+
+class ViewTransform:
+    """
+    三视图的坐标变换：显示方向与镜像（orientation，显示坐标 -> 体素索引），以及绕图像中心依次绕 X、Y、Z 轴的旋转角度。
+    各视图 reslice 共用的 vtkMatrix4x4 只在角度或方向改变后重新计算一次。
+    旋转矩阵由 euler_rotation 给出，点坐标的旋转（rotate_coordinate / rotate_coordinate_plus）用的是同一个函数。
+    """
+    def __init__(self, orientation, center):
+        self.orientation = orientation
+        self.center = np.array(center, dtype=float)
+        self.angles = (0.0, 0.0, 0.0)
+        self.vtk_matrix = vtk.vtkMatrix4x4()  # 原地更新，引用它的 reslice 随之失效重算
+        self.stale = True
+
+    def set_angle(self, axis, value):
+        angles = list(self.angles)
+        angles[axis] = float(value)
+        if tuple(angles) != self.angles:
+            self.angles = tuple(angles)
+            self.stale = True
+
+    def set_orientation(self, orientation):
+        self.orientation = orientation
+        self.stale = True
+
+    def update(self):
+        if not self.stale:
+            return
+        # 绕中心旋转：作用于旋转后的显示坐标，得到旋转前的显示坐标
+        rotation = np.eye(4)
+        rotation[:3, :3] = euler_rotation(*(-angle for angle in self.angles))
+        rotation[:3, 3] = self.center - rotation[:3, :3] @ self.center
+        orientation = np.array([[self.orientation.GetElement(i, j) for j in range(4)] for i in range(4)])
+        self.vtk_matrix.DeepCopy((orientation @ rotation).ravel())
+        self.stale = False
+
+
+class Crosshair:
+    """
+    一个二维视图中的当前位置标记（黄色小球）与两条十字线。
+    管线与 actor 只创建一次，位置改变时原地更新点坐标，拖动十字线不再新建任何 VTK 对象。
+    """
+    # 各视图十字线（水平、竖直）沿哪个体素轴延伸
+    LINE_AXES = {'axial': (0, 1), 'coronal': (0, 2), 'sagittal': (1, 2)}
+
+    def __init__(self, orientation):
+        self.axes = self.LINE_AXES[orientation]
+
+        self.point_source = vtk.vtkPointSource()
+        self.point_source.SetNumberOfPoints(1)
+        sphere_source = vtk.vtkSphereSource()
+        sphere_source.SetRadius(3.0)
+        glyph = vtk.vtkGlyph3D()
+        glyph.SetSourceConnection(sphere_source.GetOutputPort())
+        glyph.SetInputConnection(self.point_source.GetOutputPort())
+        mapper = vtk.vtkPolyDataMapper()
+        mapper.SetInputConnection(glyph.GetOutputPort())
+        self.marker = vtk.vtkActor()
+        self.marker.SetMapper(mapper)
+        self.marker.GetProperty().SetColor(1, 1, 0)  # 黄色
+
+        self.line_sources = []
+        self.lines = []
+        for _ in self.axes:
+            line_source = vtk.vtkLineSource()
+            line_mapper = vtk.vtkPolyDataMapper()
+            line_mapper.SetInputConnection(line_source.GetOutputPort())
+            line_actor = vtk.vtkActor()
+            line_actor.SetMapper(line_mapper)
+            self.line_sources.append(line_source)
+            self.lines.append(line_actor)
+
+    def update(self, position, dimensions, color):
+        self.point_source.SetCenter(*position)
+        for line_source, line_actor, axis in zip(self.line_sources, self.lines, self.axes):
+            start = list(position)
+            end = list(position)
+            start[axis] = 0
+            end[axis] = dimensions[axis] - 1
+            line_source.SetPoint1(*start)
+            line_source.SetPoint2(*end)
+            line_actor.GetProperty().SetColor(*color)
+
+
+class RenderScheduler:
+    """
+    合并各视图的绘制请求：request 只把视图标记为待绘制，回到事件循环后每个视图最多绘制一次，
+    两次绘制之间至少间隔 1 / RENDER_MAX_FPS 秒。
+    vtkImageViewer2.SetSlice 会立即绘制，切片也先记下，绘制时才设置。
+    prepare(target) 在每个视图绘制之前调用，用于在绘制开始前调整管线（如选择金字塔层级）。
+    """
+    def __init__(self, parent, max_fps=RENDER_MAX_FPS, prepare=None):
+        self.prepare = prepare
+        self.viewers = {}  # render window -> 负责绘制它的 viewer
+        self.dirty = {}  # render window -> 待调用 Render 的对象，保持请求顺序
+        self.slices = {}  # viewer -> 待设置的切片
+        self.interval = 1.0 / max_fps
+        self.last_flush = 0.0
+        self.timer = QTimer(parent)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.flush)
+
+    def register(self, viewer):
+        self.viewers[viewer.GetRenderWindow()] = viewer
+
+    def request(self, *targets):
+        # target 可以是 viewer、renderer 或 render window，同一窗口的请求合并
+        for target in targets:
+            window = target if isinstance(target, vtk.vtkRenderWindow) else target.GetRenderWindow()
+            self.dirty[window] = self.viewers.get(window, window)
+        if self.dirty and not self.timer.isActive():
+            wait = self.last_flush + self.interval - time.perf_counter()
+            self.timer.start(max(0, int(wait * 1000)))
+
+    def set_slice(self, viewer, slice_index):
+        self.slices[viewer] = slice_index
+        self.request(viewer)
+
+    def slice(self, viewer):
+        # 尚未绘制时返回待设置的切片
+        return self.slices.get(viewer, viewer.GetSlice())
+
+    def flush(self):
+        self.timer.stop()
+        self.last_flush = time.perf_counter()
+        dirty, self.dirty = self.dirty, {}
+        for target in dirty.values():
+            if self.prepare:
+                self.prepare(target)
+            slice_index = self.slices.pop(target, None)
+            if slice_index is not None:
+                previous = target.GetSlice()
+                target.SetSlice(slice_index)
+                if target.GetSlice() != previous:
+                    continue  # SetSlice 已经绘制过
+            target.Render()
+
+    def cancel(self):
+        self.timer.stop()
+        self.dirty.clear()
+        self.slices.clear()
+
+
+def pick_on_slice(renderer, display_position, axis, position):
+    """
+    二维视图中把屏幕坐标换算为切片平面（axis 轴坐标为 position）上的世界坐标。
+    只用相机矩阵求视线与切片平面的交点，不读回深度缓冲，也不遍历场景中的 actor。
+    """
+    near_far = []
+    for depth in (0.0, 1.0):
+        renderer.SetDisplayPoint(display_position[0], display_position[1], depth)
+        renderer.DisplayToWorld()
+        x, y, z, w = renderer.GetWorldPoint()
+        near_far.append((x / w, y / w, z / w))
+    near, far = near_far
+    span = far[axis] - near[axis]
+    t = (position - near[axis]) / span if span else 0.0  # 视线与切片平面平行时取近平面上的点
+    point = [near[i] + t * (far[i] - near[i]) for i in range(3)]
+    point[axis] = position
+    return tuple(point)
+
+
+class SceneRegistry:
+    """
+    各二维视图中叠加显示的 actor，按图层登记：crosshair（十字线）、position（当前位置标记）、
+    markers（标记点）、measurements（测量线）、text（测量文字）。
+    重置视图时只移除登记过的图层，不扫描渲染器中的全部 actor。
+    可擦除的图层另按 actor 中心坐标建网格索引，半径查询只检查覆盖到的格子；
+    actor 可以带上所属记录的键（如 marked_points 的键），擦除时按键删除记录，登记与删除都是 O(1)。
+    """
+    LAYERS = ('crosshair', 'position', 'markers', 'measurements', 'text')
+    ANNOTATION_LAYERS = ('markers', 'measurements', 'text')  # 随序列重置、可擦除的图层
+
+    def __init__(self, cell=ANNOTATION_GRID_CELL):
+        self.cell = cell
+        self.layers = {}  # renderer -> {图层: {actor: None}}，保持加入顺序
+        self.grids = {}  # renderer -> {网格坐标: {actor: 中心}}
+        self.entries = {}  # actor -> (renderer, 图层, 网格坐标, 中心, 记录的键)
+
+    def cell_of(self, point):
+        return tuple(int(value // self.cell) for value in point)
+
+    def add(self, renderer, actor, layer, record_key=None):
+        renderer.AddActor(actor)
+        self.layers.setdefault(renderer, {}).setdefault(layer, {})[actor] = None
+        key = center = None
+        if layer in self.ANNOTATION_LAYERS:
+            center = actor.GetCenter()
+            key = self.cell_of(center)
+            self.grids.setdefault(renderer, {}).setdefault(key, {})[actor] = center
+        self.entries[actor] = (renderer, layer, key, center, record_key)
+
+    def remove(self, actor):
+        # 从渲染器移除并注销，返回 actor 所属记录的键
+        renderer, layer, key, center, record_key = self.entries.pop(actor)
+        renderer.RemoveActor(actor)
+        del self.layers[renderer][layer][actor]
+        if key is not None:
+            cell = self.grids[renderer][key]
+            del cell[actor]
+            if not cell:
+                del self.grids[renderer][key]
+        return record_key
+
+    def actors(self, renderer, layer):
+        return list(self.layers.get(renderer, {}).get(layer, ()))
+
+    def set_visible(self, layer, visible):
+        for layers in self.layers.values():
+            for actor in layers.get(layer, ()):
+                actor.SetVisibility(visible)
+
+    def clear(self, renderer, layers=ANNOTATION_LAYERS):
+        # 移除一个视图中指定图层的全部 actor
+        for layer in layers:
+            for actor in self.actors(renderer, layer):
+                self.remove(actor)
+
+    def query(self, renderer, point, radius):
+        # 可擦除图层中，中心到 point 的距离不超过 radius 的 actor
+        grid = self.grids.get(renderer)
+        if not grid:
+            return []
+        low = self.cell_of([value - radius for value in point])
+        high = self.cell_of([value + radius for value in point])
+        found = []
+        for key in itertools.product(*(range(low[axis], high[axis] + 1) for axis in range(3))):
+            for actor, center in grid.get(key, {}).items():
+                if sum((center[axis] - point[axis]) ** 2 for axis in range(3)) <= radius * radius:
+                    found.append(actor)
+        return found
+
+
+class ToolDispatcher:
+    """
+    一个交互器上某个鼠标事件的唯一 observer：按当前工具模式选出一个处理函数调用，
+    不再为每个工具各注册一个 observer、每次事件逐个判断是否轮到自己。
+    latency 按处理函数记录调用次数、总耗时与最长耗时（秒），用来查看每次事件的响应时间。
+    """
+    def __init__(self, interactor, event, select, priority=0.0):
+        self.select = select  # 无参数，返回当前应处理事件的函数，没有时返回 None
+        self.latency = {}
+        self.tag = interactor.AddObserver(event, self.dispatch, priority)
+
+    def dispatch(self, obj, event):
+        handler = self.select()
+        if handler is None:
+            return
+        start = time.perf_counter()
+        handler(obj, event)
+        elapsed = time.perf_counter() - start
+        count, total, longest = self.latency.get(handler.__name__, (0, 0, 0.0))
+        self.latency[handler.__name__] = (count + 1, total + elapsed, max(longest, elapsed))
+
+
+class InteractionBindings:
+    """
+    记录本程序在交互器上注册的 observer：(对象, 事件, 处理函数) -> observer tag。
+    同一处理函数在同一对象的同一事件上只注册一次，重复打开序列不会让一次事件触发多次回调。
+    """
+    def __init__(self):
+        self.tags = {}
+
+    def bind(self, obj, event, handler, priority=0.0):
+        key = (obj, event, handler)
+        if key not in self.tags:
+            self.tags[key] = obj.AddObserver(event, handler, priority)
+        return self.tags[key]
+
+    def unbind(self, obj, event, handler):
+        tag = self.tags.pop((obj, event, handler), None)
+        if tag is not None:
+            obj.RemoveObserver(tag)
+
+
+# 扫描序列时只读取的头信息标签，均位于像素数据之前
+SERIES_TAGS = ["PatientID", "StudyInstanceUID", "SeriesInstanceUID", "InstanceNumber",
+               "ImageOrientationPatient", "ImagePositionPatient", "SliceThickness", "PixelSpacing",
+               "Rows", "Columns", "NumberOfFrames"]
+
+
+class DicomSeries:
+    """
+    切片序列的头信息描述：按 ImagePositionPatient 排好序的文件列表与体数据几何，体素排列为 (z, y, x)。
+    """
+    def __init__(self, filenames, series_uid, study_uid, patient_id, transfer_syntax_uid,
+                 rows, columns, frames, image_orientation_patient, image_position_patient,
+                 pixel_spacing, slice_thickness, slice_spacing, uniform):
+        self.filenames = filenames  # 排序后的文件列表
+        self.series_uid = series_uid
+        self.study_uid = study_uid
+        self.patient_id = patient_id
+        self.transfer_syntax_uid = transfer_syntax_uid
+        self.rows = rows
+        self.columns = columns
+        self.frames = frames  # 切片数
+        self.image_orientation_patient = image_orientation_patient  # 行、列方向余弦，共 6 个数
+        self.image_position_patient = image_position_patient  # 第一张切片左上角的位置
+        self.pixel_spacing = pixel_spacing  # [行间距, 列间距]
+        self.slice_thickness = slice_thickness
+        self.slice_spacing = slice_spacing  # 由相邻切片位置算出的层间距
+        self.uniform = uniform  # 层间距是否均匀
+
+    @property
+    def shape(self):
+        return self.frames, self.rows, self.columns
+
+    @property
+    def spacing(self):
+        return self.pixel_spacing[1], self.pixel_spacing[0], self.slice_spacing
+
+    @property
+    def direction(self):
+        row_cosines = np.array(self.image_orientation_patient[:3], dtype=float)
+        column_cosines = np.array(self.image_orientation_patient[3:], dtype=float)
+        return np.column_stack((row_cosines, column_cosines, np.cross(row_cosines, column_cosines)))
+
+
+def read_dicom_header(filename):
+    return pydicom.dcmread(filename, stop_before_pixels=True, specific_tags=SERIES_TAGS)
+
+
+def scan_dicom_series(filenames, workers=1, check_cancelled=None):
+    """
+    只读取每个文件像素数据之前的少量头信息（stop_before_pixels），
+    按切片位置在法向量上的投影排序、检查层间距是否均匀，返回 DicomSeries。
+    check_cancelled 在读取每个文件前调用，取消时由它抛出异常，不必等整个序列扫描完。
+    """
+    def read_header(filename):
+        if check_cancelled:
+            check_cancelled()
+        return read_dicom_header(filename)
+
+    if workers > 1 and len(filenames) > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            headers = list(executor.map(read_header, filenames))
+    else:
+        headers = [read_header(filename) for filename in filenames]
+
+    first = headers[0]
+    for header in headers[1:]:
+        if header.get("SeriesInstanceUID") != first.get("SeriesInstanceUID"):
+            raise ValueError("所选文件不属于同一个序列")
+        if (header.Rows, header.Columns) != (first.Rows, first.Columns):
+            raise ValueError("所选切片的尺寸不一致")
+
+    image_orientation_patient = [float(v) for v in first.get("ImageOrientationPatient", [1, 0, 0, 0, 1, 0])]
+    normal = np.cross(image_orientation_patient[:3], image_orientation_patient[3:])
+
+    order = list(range(len(headers)))
+    positions = None
+    if all("ImagePositionPatient" in header for header in headers):
+        positions = np.array([[float(v) for v in header.ImagePositionPatient] for header in headers])
+        distances = positions @ normal
+        order.sort(key=lambda i: distances[i])
+    elif all("InstanceNumber" in header for header in headers):
+        order.sort(key=lambda i: int(headers[i].InstanceNumber))
+
+    slice_thickness = float(first.SliceThickness) if first.get("SliceThickness") else None
+    slice_spacing = slice_thickness
+    uniform = True
+    if positions is not None and len(order) > 1:
+        gaps = np.diff(distances[order])
+        slice_spacing = float(np.median(gaps))
+        uniform = bool(np.max(np.abs(gaps - slice_spacing)) <= max(1e-3, 0.01 * abs(slice_spacing)))
+        if not uniform:
+            print(f"Warning: non-uniform slice spacing, from {gaps.min():.4f} to {gaps.max():.4f} mm")
+    if slice_thickness is None:
+        print("Warning: SliceThickness is missing, using the slice spacing instead")
+        slice_thickness = slice_spacing if slice_spacing else 1.0
+    if not slice_spacing:
+        slice_spacing = slice_thickness
+
+    if first.get("PixelSpacing"):
+        pixel_spacing = [float(v) for v in first.PixelSpacing]
+    else:
+        print("Warning: PixelSpacing is missing, using 1.0 mm")
+        pixel_spacing = [1.0, 1.0]
+
+    frames = len(headers)
+    if len(headers) == 1:
+        frames = int(first.get("NumberOfFrames", 1) or 1)
+
+    return DicomSeries(filenames=[filenames[i] for i in order],
+                       series_uid=first.get("SeriesInstanceUID"),
+                       study_uid=first.get("StudyInstanceUID"),
+                       patient_id=first.get("PatientID"),
+                       transfer_syntax_uid=first.file_meta.get("TransferSyntaxUID"),
+                       rows=int(first.Rows),
+                       columns=int(first.Columns),
+                       frames=frames,
+                       image_orientation_patient=image_orientation_patient,
+                       image_position_patient=positions[order[0]].tolist() if positions is not None else None,
+                       pixel_spacing=pixel_spacing,
+                       slice_thickness=slice_thickness,
+                       slice_spacing=slice_spacing,
+                       uniform=uniform)
+
+
+UNCOMPRESSED_SYNTAXES = ("1.2.840.10008.1.2", "1.2.840.10008.1.2.1")  # Implicit / Explicit VR Little Endian
+
+
+def map_multiframe_pixels(filename):
+    """
+    对未压缩的单文件多帧 DICOM，直接内存映射 PixelData 元素，返回 (帧, 行, 列) 的 int16 视图，
+    只有被访问到的切片才会由操作系统读入内存。
+    压缩、非 16 位、需要 Rescale 换算等无法直接映射的情况返回 None，由调用方走常规读取。
+    """
+    with open(filename, "rb") as f:
+        header = pydicom.dcmread(f, stop_before_pixels=True)  # 读完后文件位置停在 PixelData 标签处
+        transfer_syntax = header.file_meta.get("TransferSyntaxUID")
+        if transfer_syntax not in UNCOMPRESSED_SYNTAXES:
+            return None
+        if header.get("BitsAllocated") != 16 or header.get("SamplesPerPixel", 1) != 1:
+            return None
+        if header.get("PixelRepresentation") != 1 and header.get("BitsStored", 16) > 15:
+            return None  # 无符号且可能超过 int16 范围
+        if float(header.get("RescaleSlope", 1) or 1) != 1 or float(header.get("RescaleIntercept", 0) or 0) != 0:
+            return None
+
+        if f.read(4) != b"\xe0\x7f\x10\x00":  # (7FE0,0010) PixelData
+            return None
+        if transfer_syntax == "1.2.840.10008.1.2.1" and f.read(2) in (b"OB", b"OW"):
+            f.read(2)  # 保留字节
+        length = struct.unpack("<I", f.read(4))[0]
+        data_offset = f.tell()
+
+    frames = int(header.get("NumberOfFrames", 1) or 1)
+    shape = (frames, int(header.Rows), int(header.Columns))
+    if length != frames * shape[1] * shape[2] * 2:
+        return None  # 未定义长度（封装格式）或长度不符
+
+    return np.memmap(filename, dtype="<i2", mode="c", offset=data_offset, shape=shape)
+
+
+def read_dicom_slice(filename, out):
+    """
+    读取单张切片并写入 out（二维 int16 视图）。
+    与 GDCMImageIO 读取为 itk.SS 的规则一致：先应用 RescaleSlope / RescaleIntercept，再截断转换为 int16。
+    """
+    dicom_data = pydicom.dcmread(filename)
+    pixels = dicom_data.pixel_array
+    slope = float(dicom_data.get("RescaleSlope", 1) or 1)
+    intercept = float(dicom_data.get("RescaleIntercept", 0) or 0)
+
+    if slope == 1 and intercept.is_integer():
+        out[...] = pixels.astype(np.int32) + int(intercept)
+    else:
+        out[...] = pixels * slope + intercept  # 浮点结果按 static_cast 的方式向零截断
+
+
+COMPRESSED_SYNTAXES = set(JPEGTransferSyntaxes + JPEGLSTransferSyntaxes + JPEG2000TransferSyntaxes)
+
+decode_pool = None  # 压缩切片的解码进程池，第一次用到时创建，之后一直复用，进程池损坏后重新创建
+decode_pool_lock = threading.Lock()
+
+
+def get_decode_pool():
+    global decode_pool
+    with decode_pool_lock:
+        if decode_pool is None:
+            # spawn：加载线程运行时 fork 不安全，且与 Windows / 打包后的行为一致
+            decode_pool = ProcessPoolExecutor(max_workers=DECODE_PROCESSES,
+                                              mp_context=multiprocessing.get_context("spawn"))
+        return decode_pool
+
+
+def discard_decode_pool(pool):
+    # 解码进程异常退出后进程池不能再用，丢掉它，下一次 get_decode_pool 重新创建
+    global decode_pool
+    with decode_pool_lock:
+        if decode_pool is pool:
+            decode_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def decode_dicom_batch(filenames, rows, columns):
+    """
+    在解码进程中解码一批切片，返回 (len(filenames), rows, columns) 的 int16 数组，由加载线程拷回体数据。
+    JPEG 类解码受 CPU 限制且不释放 GIL，放到多个进程中才能真正并行。
+    """
+    batch = np.empty((len(filenames), rows, columns), dtype=np.int16)
+    for i, filename in enumerate(filenames):
+        read_dicom_slice(filename, batch[i])
+    return batch
+
+
+def read_dicom_itk(filenames):
+    """
+    用 ITK/GDCM 读取切片序列，返回 (z, y, x) int16 体数据视图；视图持有 ITK 图像的引用，不做拷贝。
+    """
+    reader = itk.ImageSeriesReader[itk.Image[itk.SS, 3]].New()
+    dicom_io = itk.GDCMImageIO.New()
+    reader.SetImageIO(dicom_io)
+    reader.SetFileNames(filenames)
+    reader.Update()
+    return itk.array_view_from_image(reader.GetOutput())
+
+
+class VolumeCache:
+    """
+    解码后体数据的本地磁盘缓存。每个序列存为一个可内存映射的 .npy，旁边放一个 .json 说明文件；
+    键由 SeriesInstanceUID 和每个文件的路径、修改时间、大小共同决定，原始文件变动后自然失效。
+    .json 的修改时间记录最近一次使用，总大小超出 budget 时从最久未用的开始淘汰。
+    """
+    def __init__(self, directory=VOLUME_CACHE_DIR, budget=VOLUME_CACHE_BUDGET):
+        self.directory = directory
+        self.budget = budget
+
+    def key(self, series):
+        digest = hashlib.sha1(str(series.series_uid).encode("utf-8"))
+        for filename in series.filenames:
+            stat = os.stat(filename)
+            digest.update(f"|{os.path.abspath(filename)}|{stat.st_mtime_ns}|{stat.st_size}".encode("utf-8"))
+        return digest.hexdigest()
+
+    def paths(self, key):
+        return os.path.join(self.directory, key + ".npy"), os.path.join(self.directory, key + ".json")
+
+    def contains(self, series):
+        return os.path.exists(self.paths(self.key(series))[0])
+
+    def load(self, series):
+        """命中时返回写时复制（mmap_mode='c'）的内存映射数组，未命中返回 None。"""
+        volume_path, meta_path = self.paths(self.key(series))
+        if not (os.path.exists(volume_path) and os.path.exists(meta_path)):
+            return None
+        try:
+            volume = np.load(volume_path, mmap_mode="c")
+            os.utime(meta_path)  # 记录最近使用时间
+        except (OSError, ValueError) as e:
+            print(f"Warning: failed to read cached volume {volume_path}: {e}")
+            return None
+        if volume.dtype != np.int16 or volume.ndim != 3:
+            return None
+        return volume
+
+    def store(self, series, volume):
+        key = self.key(series)
+        volume_path, meta_path = self.paths(key)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            # 先写临时文件再改名，避免中途退出留下半个缓存
+            with open(volume_path + ".tmp", "wb") as f:
+                np.save(f, volume)
+            os.replace(volume_path + ".tmp", volume_path)
+            with open(meta_path, "w", encoding="utf-8") as f:
+                json.dump({"series_uid": series.series_uid,
+                           "shape": list(volume.shape),
+                           "spacing": list(series.spacing),
+                           "files": len(series.filenames),
+                           "created": time.time()}, f)
+        except OSError as e:
+            print(f"Warning: failed to cache volume: {e}")
+            return
+        self.evict(keep=key)
+
+    def evict(self, keep=None):
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".npy"):
+                continue
+            key = name[:-4]
+            volume_path, meta_path = self.paths(key)
+            try:
+                size = os.path.getsize(volume_path)
+                last_used = os.path.getmtime(meta_path) if os.path.exists(meta_path) else 0
+            except OSError:
+                continue
+            entries.append((last_used, size, key))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, key in sorted(entries):
+            if total <= self.budget:
+                break
+            if key == keep:
+                continue
+            try:
+                for path in self.paths(key):
+                    if os.path.exists(path):
+                        os.remove(path)
+            except OSError:
+                continue  # 正被内存映射的文件在 Windows 上无法删除，下次再淘汰
+            total -= size
+
+
+CATALOG_TAGS = ["PatientID", "PatientName", "StudyInstanceUID", "StudyDate", "StudyDescription",
+                "SeriesInstanceUID", "SeriesNumber", "SeriesDescription", "Modality", "SOPInstanceUID"]
+
+
+def stat_file(path):
+    # (路径, 修改时间, 大小)；DICOMDIR 中登记但实际不存在的文件返回 None
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return path, stat.st_mtime_ns, stat.st_size
+
+
+def scan_folder(path, known=None):
+    """
+    列出一个目录，返回 (目录修改时间, 文件列表, 子目录列表)，文件为 (路径, 修改时间, 大小)。
+    known 为上次的结果；目录修改时间没变说明其中没有增删、改名，直接沿用，不再逐个 stat 文件。
+    （原地改写内容而不改名的文件因此不会被发现，DICOM 文件写入后一般不再改动。）
+    """
+    mtime_ns = os.stat(path).st_mtime_ns  # 先取修改时间再列目录，列目录期间的改动下次还能发现
+    if known is not None and known[0] == mtime_ns:
+        return known
+    files, folders = [], []
+    with os.scandir(path) as iterator:
+        for entry in iterator:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    folders.append(entry.path)
+                elif entry.is_file():
+                    stat = entry.stat()
+                    files.append((entry.path, stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                continue  # 列出之后、stat 之前被删除的文件
+    return mtime_ns, files, folders
+
+
+def list_folder_files(root, known=None, workers=1):
+    """
+    列出文件夹中的候选文件 (路径, 修改时间, 大小) 与遍历到的目录 (路径, 修改时间)。
+    有 DICOMDIR 时只取其中登记的文件，否则遍历整个目录树；各目录的列举与 stat 分派到 workers 个线程中。
+    known 为上次遍历的 {目录: scan_folder 的结果}，修改时间没变的目录沿用上次的结果，只需 stat 目录本身。
+    """
+    root = os.path.abspath(root)
+    known = known or {}
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        dicomdir = os.path.join(root, "DICOMDIR")
+        if os.path.isfile(dicomdir):
+            paths = [os.path.abspath(instance.path) for instance in FileSet(pydicom.dcmread(dicomdir))]
+            return [entry for entry in executor.map(stat_file, paths) if entry is not None], []
+
+        entries, folders = [], []
+        pending = {executor.submit(scan_folder, root, known.get(root)): root}
+        while pending:
+            completed, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in completed:
+                path = pending.pop(future)
+                try:
+                    mtime_ns, files, subfolders = future.result()
+                except OSError:
+                    if path == root:
+                        raise
+                    folders.append((path, None))  # 遍历过程中被删除或无权访问的子目录，仍然记下，下次重新列举
+                    continue
+                entries.extend(files)
+                folders.append((path, mtime_ns))
+                for folder in subfolders:
+                    pending[executor.submit(scan_folder, folder, known.get(folder))] = folder
+    return entries, folders
+
+
+def read_catalog_header(filename):
+    # 不是 DICOM 的文件返回 None，同样记入目录，下次不再重复读取
+    try:
+        return pydicom.dcmread(filename, stop_before_pixels=True, specific_tags=CATALOG_TAGS)
+    except (InvalidDicomError, OSError):
+        return None
+
+
+class SeriesCatalog:
+    """
+    SQLite 序列目录：记录扫描过的每个文件的修改时间、大小与所属序列，以及病人/检查/序列信息。
+    再次打开同一文件夹时修改时间未变的目录不再列举，只重新读取新增或改动过的文件头，其余直接查表。
+    每次操作单独建立连接，可以在后台线程中使用。
+    """
+    def __init__(self, path=CATALOG_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self.connect() as db:
+            db.executescript("""
+                CREATE TABLE IF NOT EXISTS series (
+                    series_uid TEXT PRIMARY KEY,
+                    patient_id TEXT,
+                    patient_name TEXT,
+                    study_uid TEXT,
+                    study_date TEXT,
+                    study_description TEXT,
+                    series_number INTEGER,
+                    series_description TEXT,
+                    modality TEXT
+                );
+                CREATE TABLE IF NOT EXISTS files (
+                    path TEXT PRIMARY KEY,
+                    mtime_ns INTEGER,
+                    size INTEGER,
+                    series_uid TEXT,  -- 非 DICOM 文件为 NULL
+                    sop_uid TEXT  -- 同一张图像在文件夹中有多份拷贝时只取一份
+                );
+                CREATE INDEX IF NOT EXISTS files_series ON files (series_uid);
+                CREATE TABLE IF NOT EXISTS folders (
+                    path TEXT PRIMARY KEY,
+                    mtime_ns INTEGER  -- 修改时间没变的目录再次扫描时不必重新列举
+                );
+            """)
+
+    @contextmanager
+    def connect(self):
+        db = sqlite3.connect(self.path, timeout=30)
+        try:
+            with db:  # 正常结束时提交，异常时回滚
+                yield db
+        finally:
+            db.close()
+
+    @staticmethod
+    def folder_range(root):
+        # 文件夹下所有路径在字典序上落在 [root/, root0) 之间（'0' 是 '/' 的下一个字符），可以直接用主键索引做范围查询；
+        # SQLite 按 UTF-8 字节比较，与码位顺序一致，不受路径中非 BMP 字符的影响
+        prefix = os.path.join(os.path.abspath(root), "")
+        return prefix, prefix[:-1] + chr(ord(os.sep) + 1)
+
+    def index(self, root, workers=LOAD_WORKERS, progress=None):
+        """
+        扫描文件夹并更新目录，返回其中的序列列表（见 series_in）。
+        progress(已读取数, 待读取数) 在读取文件头的过程中被调用。
+        """
+        with self.connect() as db:
+            known = {path: (mtime_ns, size) for path, mtime_ns, size in db.execute(
+                "SELECT path, mtime_ns, size FROM files WHERE path >= ? AND path < ?", self.folder_range(root))}
+            known_folders = db.execute("SELECT path, mtime_ns FROM folders WHERE path = ? OR (path >= ? AND path < ?)",
+                                       (os.path.abspath(root), *self.folder_range(root))).fetchall()
+
+        # 由上次的记录还原各目录的列举结果：{目录: (修改时间, 文件列表, 子目录列表)}
+        listings = {folder: (mtime_ns, [], []) for folder, mtime_ns in known_folders}
+        for path, (mtime_ns, size) in known.items():
+            if os.path.dirname(path) in listings:
+                listings[os.path.dirname(path)][1].append((path, mtime_ns, size))
+        for folder, _ in known_folders:
+            if folder != os.path.abspath(root) and os.path.dirname(folder) in listings:
+                listings[os.path.dirname(folder)][2].append(folder)
+
+        entries, folders = list_folder_files(root, listings, workers)
+
+        changed = [entry for entry in entries if known.get(entry[0]) != (entry[1], entry[2])]
+        removed = known.keys() - {entry[0] for entry in entries}
+
+        headers = [None] * len(changed)
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            futures = {executor.submit(read_catalog_header, entry[0]): i for i, entry in enumerate(changed)}
+            for done, future in enumerate(as_completed(futures), 1):
+                headers[futures[future]] = future.result()
+                if progress and (done % 64 == 0 or done == len(changed)):
+                    progress(done, len(changed))
+
+        with self.connect() as db:
+            db.executemany("DELETE FROM files WHERE path = ?", [(path,) for path in removed])
+            db.execute("DELETE FROM folders WHERE path = ? OR (path >= ? AND path < ?)",
+                       (os.path.abspath(root), *self.folder_range(root)))
+            db.executemany("INSERT INTO folders VALUES (?, ?)", folders)
+            for (path, mtime_ns, size), header in zip(changed, headers):
+                series_uid = header.get("SeriesInstanceUID") if header is not None else None
+                if series_uid:
+                    db.execute("INSERT OR REPLACE INTO series VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", (
+                        series_uid, header.get("PatientID"), str(header.get("PatientName", "")),
+                        header.get("StudyInstanceUID"), header.get("StudyDate"), header.get("StudyDescription"),
+                        header.get("SeriesNumber"), header.get("SeriesDescription"), header.get("Modality")))
+                sop_uid = header.get("SOPInstanceUID") if header is not None else None
+                db.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)",
+                           (path, mtime_ns, size, series_uid or None, sop_uid or None))
+
+        return self.series_in(root)
+
+    def series_in(self, root):
+        """
+        文件夹中的序列：(series_uid, patient_id, patient_name, study_date, study_description,
+        series_number, series_description, modality, 文件数) 的列表。
+        """
+        with self.connect() as db:
+            return db.execute("""
+                SELECT s.series_uid, s.patient_id, s.patient_name, s.study_date, s.study_description,
+                       s.series_number, s.series_description, s.modality, COUNT(DISTINCT COALESCE(f.sop_uid, f.path))
+                FROM files f JOIN series s ON f.series_uid = s.series_uid
+                WHERE f.path >= ? AND f.path < ?
+                GROUP BY s.series_uid
+                ORDER BY s.patient_id, s.study_date, s.series_number
+            """, self.folder_range(root)).fetchall()
+
+    def files_of(self, series_uid, root):
+        with self.connect() as db:
+            rows = db.execute("""
+                SELECT MIN(path) FROM files
+                WHERE series_uid = ? AND path >= ? AND path < ?
+                GROUP BY COALESCE(sop_uid, path)
+                ORDER BY 1
+            """, (series_uid, *self.folder_range(root))).fetchall()
+        return [path for path, in rows]
+
+
+class FolderScanner(QObject):
+    """
+    在后台线程中扫描文件夹并更新 SeriesCatalog，完成后发出 finished(文件夹, 序列列表)。
+    """
+    progress = Signal(int, int)
+    finished = Signal(str, object)
+    failed = Signal(str)
+
+    def __init__(self, catalog, root, workers=LOAD_WORKERS):
+        super().__init__()
+        self.catalog = catalog
+        self.root = root
+        self.workers = workers
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        try:
+            series = self.catalog.index(self.root, self.workers, self.progress.emit)
+        except Exception as e:
+            print(f"Error scanning folder: {e}")
+            self.failed.emit(str(e))
+            return
+        self.finished.emit(self.root, series)
+
+
+class LoadCancelled(Exception):
+    pass
+
+
+class VolumeLoader(QObject):
+    """
+    体数据加载：读头信息、查找内存映射/磁盘缓存、按块解码切片，全部在后台线程中完成，
+    主线程只负责在 ready 之后把体数据接入 VTK 管线。
+    流式加载时先交出全零的体数据并发出 ready，再按从中间向两端的顺序逐块（slab）填充，中间的三视图切片最先可见。
+    信号都在后台线程中发出，连接到主线程对象的槽函数时由 Qt 排队到主线程执行。
+    """
+    ready = Signal(object, object)  # DicomSeries，(z, y, x) int16 体数据（流式时仍在填充）
+    progress = Signal(int, int)  # 已解码切片数，总切片数
+    slab_loaded = Signal(int, int)  # 刚完成的切片范围 [z0, z1)
+    finished = Signal()
+    failed = Signal(str)
+    cancelled = Signal()
+
+    def __init__(self, filenames, workers=LOAD_WORKERS, cache=None, stream=False, slab=STREAM_SLAB, series=None):
+        super().__init__()
+        self.filenames = filenames
+        self.series = series  # 已经读过的头信息（重新取回换出的序列时），为 None 时先扫描
+        self.workers = max(1, workers)
+        self.cache = cache
+        self.stream = stream
+        self.slab = slab
+        self.streamed = False  # ready 是否已在解码完成前发出
+        self.cancel_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def check_cancelled(self):
+        if self.cancel_event.is_set():
+            raise LoadCancelled()
+
+    def run(self):
+        try:
+            series, volume = self.load(self.series)
+        except LoadCancelled:
+            self.cancelled.emit()
+            return
+        except Exception as e:
+            print(f"Error reading DICOM files: {e}")
+            self.failed.emit(str(e))
+            return
+
+        if not self.streamed:
+            self.ready.emit(series, volume)
+        self.finished.emit()
+
+    def load(self, series=None):
+        """
+        同步加载，返回 (DicomSeries, 体数据)；出错时抛出异常，取消时抛出 LoadCancelled。
+        已经读过头信息时可以直接传入 series。
+        """
+        if series is None:
+            series = scan_dicom_series(self.filenames, self.workers, self.check_cancelled)
+        self.check_cancelled()
+        filenames = series.filenames
+
+        if len(filenames) == 1:
+            # 单文件多帧：能直接映射原文件就不解码也不进缓存
+            volume = map_multiframe_pixels(filenames[0])
+            if volume is not None:
+                return series, volume
+
+        if self.cache:
+            volume = self.cache.load(series)
+            if volume is not None:
+                return series, volume
+
+        if len(filenames) == 1:
+            volume = read_dicom_itk(filenames)
+        else:
+            volume = self.decode(series)
+        self.check_cancelled()
+
+        if self.cache:
+            self.cache.store(series, volume)
+        return series, volume
+
+    def slabs(self, depth):
+        middle = depth / 2
+        slabs = [(z0, min(z0 + self.slab, depth)) for z0 in range(0, depth, self.slab)]
+        slabs.sort(key=lambda slab: abs((slab[0] + slab[1]) / 2 - middle))
+        return slabs
+
+    def decode(self, series):
+        filenames = series.filenames
+        if self.stream:
+            # 先交出全零的体数据用于显示，解码结果直接写入其中
+            volume = np.zeros(series.shape, dtype=np.int16)
+            self.streamed = True
+            self.ready.emit(series, volume)
+        else:
+            volume = np.empty(series.shape, dtype=np.int16)
+
+        stop = threading.Event()  # 出错或取消时让其余工作线程尽快退出
+
+        def decode_slab(z0, z1):
+            for z in range(z0, z1):
+                if stop.is_set() or self.cancel_event.is_set():
+                    break
+                read_dicom_slice(filenames[z], volume[z])
+
+        compressed = series.transfer_syntax_uid in COMPRESSED_SYNTAXES and DECODE_PROCESSES > 1
+        executor = get_decode_pool() if compressed else ThreadPoolExecutor(max_workers=self.workers)
+        futures = {}
+        done = 0
+        error = None
+        try:
+            for z0, z1 in self.slabs(len(filenames)):
+                if compressed:
+                    future = executor.submit(decode_dicom_batch, filenames[z0:z1], series.rows, series.columns)
+                else:
+                    future = executor.submit(decode_slab, z0, z1)
+                futures[future] = (z0, z1)
+
+            pending = set(futures)
+            while pending:
+                # 带超时等待，解码进程中的批次无法中途停止，取消时不必等它们完成
+                completed, pending = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+                self.check_cancelled()
+                for future in completed:
+                    batch = future.result()
+                    z0, z1 = futures[future]
+                    if compressed:
+                        volume[z0:z1] = batch
+                    done += z1 - z0
+                    self.slab_loaded.emit(z0, z1)
+                    self.progress.emit(done, len(filenames))
+        except BaseException as e:
+            stop.set()
+            for future in futures:
+                future.cancel()
+            if isinstance(e, LoadCancelled) or not isinstance(e, Exception):
+                raise
+            if isinstance(e, BrokenProcessPool):
+                discard_decode_pool(executor)
+            error = e
+        finally:
+            if not compressed:
+                executor.shutdown()  # 进程池保留给下一次加载
+
+        if error is not None:
+            # pydicom 解不了的像素数据（如缺少 pylibjpeg 插件）改由 ITK/GDCM 整体读取
+            print(f"Warning: pydicom failed to decode pixels ({error}), falling back to ITK/GDCM")
+            self.check_cancelled()
+            itk_volume = read_dicom_itk(filenames)
+            if not self.streamed:
+                return itk_volume
+            volume[...] = itk_volume  # 已经交出显示的体数据原地填充
+            self.slab_loaded.emit(0, len(filenames))
+            self.progress.emit(len(filenames), len(filenames))
+        return volume
+
+
+def block_average(volume, block):
+    """
+    (z, y, x) int16 体数据按 block x block x block 块平均降采样。
+    尺寸不能整除时每个方向的最后一块只有余下的体素，按实际体素数平均，末尾的切片不会被丢掉。
+    逐层块计算，临时内存只有一层的大小。
+    """
+    starts = [np.arange(0, n, block) for n in volume.shape]
+    counts = [np.diff(start, append=n) for start, n in zip(starts, volume.shape)]
+    plane = counts[1][:, None] * counts[2][None, :]
+    result = np.empty([len(start) for start in starts], dtype=np.int16)
+    for j, z0 in enumerate(starts[0]):
+        sums = volume[z0:z0 + block].sum(axis=0, dtype=np.int32)
+        sums = np.add.reduceat(np.add.reduceat(sums, starts[1], axis=0), starts[2], axis=1)
+        result[j] = sums // (plane * counts[0][j])
+    return result
+
+
+class VolumePyramid:
+    """
+    体数据的多分辨率金字塔：factor 级为 factor 倍降采样（块平均），首次用到时才生成并缓存。
+    界面中由 PyramidBuilder 在后台生成，用 ready 判断是否已经可用。
+    各级合计不超过 budget，放不下的层级不生成，由 fit 退回更精细的已有层级。
+    各级 vtkImageData 的间距与原点使其与原体数据处在同一体素索引坐标系，可直接替换 reslice 与体绘制的输入。
+    """
+    def __init__(self, volume, budget=PYRAMID_MEMORY_BUDGET):
+        self.arrays = {1: volume}
+        self.images = {}
+        self.budget = budget
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for factor, array in self.arrays.items() if factor > 1)
+
+    @property
+    def max_factor(self):
+        # 每个方向至少保留两个体素
+        factor = 1
+        while factor * 2 <= PYRAMID_MAX_FACTOR and min(self.arrays[1].shape) // (factor * 2) >= 2:
+            factor *= 2
+        return factor
+
+    def level_bytes(self, factor):
+        return int(np.prod([-(-n // factor) for n in self.arrays[1].shape])) * self.arrays[1].itemsize
+
+    def fit(self, factor):
+        # 不超过 factor 的层级中最粗的一级：已经生成的，或生成后不超出预算的；原分辨率总是可用
+        while factor > 1 and factor not in self.arrays and self.nbytes + self.level_bytes(factor) > self.budget:
+            factor //= 2
+        return factor
+
+    def ready(self, factor):
+        return factor in self.arrays
+
+    def source(self, factor):
+        # 生成 factor 级时直接从已有的最精细的可整除层级块平均，中间层级放不下时不必先生成
+        return max(f for f in self.arrays if factor % f == 0)
+
+    def add(self, factor, array):
+        self.arrays[factor] = array
+
+    def array(self, factor):
+        if factor not in self.arrays:
+            source = self.source(factor)
+            self.add(factor, block_average(self.arrays[source], factor // source))
+        return self.arrays[factor]
+
+    def level(self, factor):
+        # factor 级的 vtkImageData：体素 j 覆盖原体素 factor * j 到 factor * j + factor - 1
+        if factor not in self.images:
+            self.images[factor] = numpy_to_vtk_image(self.array(factor), spacing=(factor,) * 3,
+                                                     origin=((factor - 1) / 2,) * 3)
+        return self.images[factor]
+
+    def level_for_voxels(self, voxels):
+        # 体素数不超过 voxels 的最精细层级
+        factor = 1
+        while factor < self.max_factor and self.arrays[1].size // factor ** 3 > voxels:
+            factor *= 2
+        return self.fit(factor)
+
+
+class PyramidBuilder(QObject):
+    """
+    在后台线程中生成金字塔的一个层级，完成后发出 built，由主线程存入 VolumePyramid。
+    源层级在主线程中选好，后台线程只读取它的数组，不访问金字塔的字典。
+    体数据是内存映射时生成过程会读入整个文件，放在后台才不会卡住界面。
+    """
+    built = Signal(object, int, object)  # VolumePyramid，层级，块平均后的 int16 数组
+    failed = Signal(str)
+
+    def __init__(self, pyramid, factor):
+        super().__init__()
+        self.pyramid = pyramid
+        self.factor = factor
+        source = pyramid.source(factor)
+        self.volume = pyramid.arrays[source]
+        self.block = factor // source
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        try:
+            array = block_average(self.volume, self.block)
+        except Exception as e:
+            print(f"Error building pyramid level {self.factor}: {e}")
+            self.failed.emit(str(e))
+            return
+        self.built.emit(self.pyramid, self.factor, array)
+
+
+class VolumeManager:
+    """
+    按最近使用顺序管理各 DICOMViewer 的体数据内存：超出预算时把不在使用中的体数据换出到磁盘表示
+    （体数据缓存或原始多帧文件），再次用到时重新映射回来。标注、坐标等状态始终保留在 DICOMViewer 中。
+    只统计匿名内存；已经是文件映射的体数据，其页面可由操作系统随时回收，不计入预算。
+    """
+    def __init__(self, budget=VOLUME_MEMORY_BUDGET):
+        self.budget = budget
+        self.recent = []  # 最近使用的排在后面
+
+    @staticmethod
+    def resident_bytes(viewer):
+        if viewer.volume is None:
+            return 0
+        pyramid = viewer.pyramid.nbytes if viewer.pyramid is not None else 0
+        if isinstance(viewer.volume, np.memmap):
+            return pyramid
+        return viewer.volume.nbytes + pyramid
+
+    def acquire(self, viewer, pinned=()):
+        """
+        把 viewer 标记为最近使用，然后按预算换出其它体数据。pinned 中的不会被换出。
+        viewer 的体数据必须已在内存中，被换出的先由 MainWindow.restore_in_background 在后台取回。
+        """
+        if viewer in self.recent:
+            self.recent.remove(viewer)
+        self.recent.append(viewer)
+        self.enforce(tuple(pinned) + (viewer,))
+        return viewer.vtk_image
+
+    def forget(self, viewer):
+        if viewer in self.recent:
+            self.recent.remove(viewer)
+
+    def enforce(self, pinned=()):
+        total = sum(self.resident_bytes(viewer) for viewer in self.recent)
+        for viewer in list(self.recent):
+            if total <= self.budget:
+                break
+            if viewer in pinned or viewer.loader is not None:
+                continue  # 正在显示或仍在后台写入的体数据不能换出
+            size = self.resident_bytes(viewer)
+            if size:
+                viewer.release_volume()
+                total -= size
+
+
 class DICOMViewer:
-    def __init__(self, dicom_file=None):
+    def __init__(self, dicom_file=None, workers=LOAD_WORKERS, cache=None, stream=False):
         self.dicom_file = dicom_file
+        self.workers = workers  # 并行解码线程数
+        self.cache = cache  # VolumeCache，为 None 时不使用磁盘缓存
+        self.stream = stream  # 是否流式加载
+        self.loader = None  # 后台加载尚未完成时的 VolumeLoader
+        self.volume = None  # vtk_image 引用的 (z, y, x) 体数据，被 VolumeManager 换出时为 None
+        self.pyramid = None  # volume 的多分辨率金字塔，各级在用到时才生成
         self.vtk_image = None
         self.slice_thickness = None
         self.pixel_spacing = None
+        self.image_orientation_patient = None
+        self.image_position_patient = None
+        self.series = None  # DicomSeries 头信息描述
+        self.orientation = None  # 显示坐标 -> 体素索引的 vtkMatrix4x4，由 ImageOrientationPatient 求出
+
+        # 物理几何信息，vtk_image 本身保持体素索引空间
+        self.spacing = None
+        self.origin = None
+        self.direction = None
 
         self.system = 0
 
@@ -92,12 +1396,10 @@ class DICOMViewer:
         self.HtL = None
         self.SR = None
 
-        self.marked_points = []
+        self.marked_points = {}  # 标记点编号 -> (名称, 坐标, 角度, 物理坐标)，保持标记顺序
         self.key_points = []
         self.distances = []
         self.angles = []
-        self.markers = []  # 储存现在坐标在三视图上的红点actor
-        self.lines = []  # 储存线条actor
         self.state_snapshots = deque(maxlen=3)  # 保存最近的三次状态快照
 
         self.x = 0
@@ -107,9 +1409,7 @@ class DICOMViewer:
         self.y_angle = 0
         self.z_angle = 0
 
-        self.lr_count = 0
-        self.fh_count = 0
-        self.tb_count = 0
+        self.mirrored = [False, False, False]  # 沿显示坐标 x、y、z 轴（左右、前后、上下）是否镜像
 
         self.width = 0
         self.height = 0
@@ -119,36 +1419,68 @@ class DICOMViewer:
             self.vtk_image=self.load_dicom_files(dicom_file)
 
     def load_dicom_files(self, filenames):
-        reader = itk.ImageSeriesReader[itk.Image[itk.SS, 3]].New()
-        dicom_io = itk.GDCMImageIO.New()
-        reader.SetImageIO(dicom_io)
-        reader.SetFileNames(filenames)
-
+        # 同步加载，供直接传入文件名构造时使用；界面中的加载走 MainWindow.load_in_background
         try:
-            reader.Update()
+            series, volume = VolumeLoader(filenames, self.workers, self.cache).load()
         except Exception as e:
             print(f"Error reading DICOM files: {e}")
             return None
+        return self.attach_volume(series, volume)
 
-        itk_image = reader.GetOutput()
-        vtk_image = itk_to_vtk_image(itk_image)
-
-        dicom_data = pydicom.dcmread(filenames[0])
-        self.slice_thickness = dicom_data.SliceThickness
-        self.pixel_spacing = dicom_data.PixelSpacing
-
-        dimensions = vtk_image.GetDimensions()
+    def attach_volume(self, series, volume):
+        """
+        把加载好的 (z, y, x) 体数据零拷贝包装为 vtkImageData，并根据头信息设置几何参数。必须在主线程调用。
+        """
+        self.series = series
+        self.volume = volume
+        self.pyramid = VolumePyramid(volume)
+        vtk_image = numpy_to_vtk_image(volume)
+        self.vtk_image = vtk_image
+
+        self.slice_thickness = series.slice_thickness
+        self.pixel_spacing = series.pixel_spacing
+        self.image_orientation_patient = series.image_orientation_patient
+        self.image_position_patient = series.image_position_patient
+        self.spacing = series.spacing
+        self.origin = tuple(series.image_position_patient or (0, 0, 0))
+        self.direction = series.direction
+
+        # 显示方向只在接入时计算一次，width/height/depth 均为显示坐标下的尺寸
+        self.orientation, dimensions = display_orientation(self.direction, vtk_image.GetDimensions())
         self.width, self.height, self.depth = dimensions
 
-        self.x = vtk_image.GetDimensions()[0] // 2
+        self.x = self.width // 2
         self.y = 768 - 316
-        self.z = vtk_image.GetDimensions()[2] // 2
+        self.z = self.depth // 2
 
-        del reader
-        del dicom_io
-        del dicom_data
         return vtk_image
 
+    def display_matrix(self):
+        # 显示坐标 -> 体素索引：先按镜像状态翻转显示坐标，再按显示方向映射到体素索引
+        mirror = mirror_matrix((self.width, self.height, self.depth),
+                               [axis for axis in range(3) if self.mirrored[axis]])
+        matrix = vtk.vtkMatrix4x4()
+        vtk.vtkMatrix4x4.Multiply4x4(self.orientation, mirror, matrix)
+        return matrix
+
+    def release_volume(self):
+        """
+        释放体数据内存，保证之后能从磁盘重新取回：文件映射的体数据本身就在磁盘上，其余的先写入体数据缓存。
+        没有缓存时重新取回需要再次解码原始文件。
+        """
+        if self.cache and not isinstance(self.volume, np.memmap) and not self.cache.contains(self.series):
+            self.cache.store(self.series, self.volume)
+        self.volume = None
+        self.pyramid = None
+        self.vtk_image = None
+
+    def restore_volume(self, volume):
+        # 接入后台重新取回的体数据（多帧映射、体数据缓存或重新解码），头信息沿用已有的 series。必须在主线程调用
+        self.volume = volume
+        self.pyramid = VolumePyramid(self.volume)
+        self.vtk_image = numpy_to_vtk_image(self.volume)
+        return self.vtk_image
+
 
 class MainWindow(QMainWindow):
     def __init__(self):
@@ -159,13 +1491,43 @@ class MainWindow(QMainWindow):
         self.view_type = None
         self.compare = 0
         self.style = None
-        self.lr_count = 0
-        self.fh_count = 0
-        self.tb_count = 0
+        self.image_actor1 = None  # 对比窗口中的两个图像 actor
+        self.image_actor2 = None
 
         self.head = True
         self.slice_thickness = None
         self.dicom_viewers = []  # 用于存储加载的 DICOMViewer 实例
+        self.volume_cache = VolumeCache()  # 解码后体数据的磁盘缓存
+        self.series_catalog = SeriesCatalog()  # 文件夹扫描得到的序列目录
+        self.volume_manager = VolumeManager()  # 各序列体数据的内存预算
+        self.compare_main_window = None  # 对比窗口
+        self.compare_viewers = []  # 对比窗口中显示的两个序列，窗口打开期间不能换出
+        self.folder_scanner = None  # 正在后台扫描的 FolderScanner
+        self.loading_viewer = None  # 正在后台加载的 DICOMViewer
+        self.restore_done = None  # 正在取回换出的序列时，取回后要调用的函数
+        self.load_queue = deque()  # 等待加载的 (文件列表, 换出的 DICOMViewer, 取回后调用的函数)，一次只加载一个序列
+
+        # 流式加载时合并刷新，避免每解码一块就重绘一次
+        self.stream_refresh_timer = QTimer(self)
+        self.stream_refresh_timer.setSingleShot(True)
+        self.stream_refresh_timer.setInterval(150)
+        self.stream_refresh_timer.timeout.connect(self.refresh_streamed_volume)
+
+        # 打开 CONCURRENT_VIEW_UPDATES 时三个视图的管线在这个线程池中同时更新
+        configure_render_threads(RENDER_THREADS)
+        concurrent = CONCURRENT_VIEW_UPDATES and RENDER_THREADS > 1
+        self.view_update_pool = ThreadPoolExecutor(max_workers=3) if concurrent else None
+
+        # 旋转时先显示低分辨率预览，角度停止变化后再按原分辨率计算
+        self.view_reslices = []  # 轴状、冠状、矢状视图各自的 reslice
+        self.view_levels = [1, 1, 1]  # 各视图当前使用的金字塔层级
+        self.view_producers = {}  # (视图, 金字塔层级) -> 该视图 reslice 的输入 producer
+        self.pyramid_builder = None  # 正在后台生成金字塔层级的 PyramidBuilder，一次只生成一级
+        self.reslice_preview = False
+        self.rotate_refine_timer = QTimer(self)
+        self.rotate_refine_timer.setSingleShot(True)
+        self.rotate_refine_timer.setInterval(ROTATE_REFINE_DELAY)
+        self.rotate_refine_timer.timeout.connect(self.refine_reslice)
         self.current_viewer_index = None
 
         self.xz_plane_3d_actor = None
@@ -202,8 +1564,6 @@ class MainWindow(QMainWindow):
         self.y_line_actor = None  # y轴
         self.z_line_actor = None  # z轴
 
-        self.flip = False
-
         # 关键点
         self.AODA = None
         self.ANS = None
@@ -211,12 +1571,11 @@ class MainWindow(QMainWindow):
         self.HtL = None
         self.SR = None
 
-        self.marked_points = []
+        self.marked_points = {}  # 标记点编号 -> (名称, 坐标, 角度, 物理坐标)，保持标记顺序
+        self.point_ids = itertools.count(1)  # 标记点编号，各序列共用，从不复用
         self.key_points = []
         self.distances = []
         self.angles = []
-        self.markers = []  # 储存现在坐标在三视图上的红点actor
-        self.lines = []  # 储存线条actor
         self.state_snapshots = deque(maxlen=3)  # 保存最近的三次状态快照
 
         self.central_widget = QWidget(self)
@@ -262,6 +1621,17 @@ class MainWindow(QMainWindow):
         self.coord_label = QLabel("Coordinates: ")
         self.layout.addWidget(self.coord_label, 8, 0)
 
+        # 后台加载进度
+        self.load_progress = QProgressBar(self.central_widget)
+        self.load_progress.setFormat("Loading %v / %m")
+        self.load_progress.hide()
+        self.layout.addWidget(self.load_progress, 8, 3, 1, 2)
+
+        self.cancel_load_button = QPushButton("Cancel", self.central_widget)
+        self.cancel_load_button.clicked.connect(self.cancel_loading)
+        self.cancel_load_button.hide()
+        self.layout.addWidget(self.cancel_load_button, 8, 5)
+
         self.current_window = 500
         self.current_level = 250
 
@@ -462,6 +1832,11 @@ class MainWindow(QMainWindow):
         # 设置3D窗口的交互样式
         style = vtkInteractorStyleTrackballCamera()
         self.render_window_interactor_3d.SetInteractorStyle(style)
+        # 旋转、缩放 3D 视图期间改用低分辨率体数据绘制
+        self.volume_3d = None
+        self.volume_3d_coarse = None
+        style.AddObserver("StartInteractionEvent", self.on_3d_interaction_start)
+        style.AddObserver("EndInteractionEvent", self.on_3d_interaction_end)
 
         self.axial_viewer = vtk.vtkResliceImageViewer()
         self.axial_viewer.SetRenderWindow(self.render_window_axial)
@@ -475,6 +1850,28 @@ class MainWindow(QMainWindow):
         self.sagittal_viewer.SetRenderWindow(self.render_window_sagittal)
         self.sagittal_viewer.SetupInteractor(self.render_window_interactor_sagittal)
 
+        # 窗宽窗位映射多线程执行
+        for viewer in (self.axial_viewer, self.coronal_viewer, self.sagittal_viewer):
+            threaded(viewer.GetWindowLevel())
+        # 所有视图的绘制都经过 render_scheduler 合并，绘制前按当前缩放为各视图选择金字塔层级
+        self.render_scheduler = RenderScheduler(self, prepare=self.prepare_view_render)
+        for viewer in (self.axial_viewer, self.coronal_viewer, self.sagittal_viewer):
+            self.render_scheduler.register(viewer)
+        # 二维视图的交互器 -> (viewer, 切片所在的轴)，用于把鼠标位置换算到切片平面上
+        self.slice_views = {self.render_window_interactor_axial: (self.axial_viewer, 2),
+                            self.render_window_interactor_coronal: (self.coronal_viewer, 1),
+                            self.render_window_interactor_sagittal: (self.sagittal_viewer, 0)}
+        # 二维视图中叠加显示的 actor，按图层登记
+        self.scene = SceneRegistry()
+        # 三视图的当前位置标记与十字线，整个程序生命周期内复用，先隐藏到第一次显示图像
+        self.crosshairs = [Crosshair(orientation) for orientation in ('axial', 'coronal', 'sagittal')]
+        for viewer, crosshair in zip((self.axial_viewer, self.coronal_viewer, self.sagittal_viewer), self.crosshairs):
+            self.scene.add(viewer.GetRenderer(), crosshair.marker, 'position')
+            for line_actor in crosshair.lines:
+                self.scene.add(viewer.GetRenderer(), line_actor, 'crosshair')
+        self.scene.set_visible('position', False)
+        self.scene.set_visible('crosshair', False)
+
         self.render_window_interactor_axial.SetInteractorStyle(vtk.vtkInteractorStyleImage())
         self.render_window_interactor_coronal.SetInteractorStyle(vtk.vtkInteractorStyleImage())
         self.render_window_interactor_sagittal.SetInteractorStyle(vtk.vtkInteractorStyleImage())
@@ -483,6 +1880,16 @@ class MainWindow(QMainWindow):
         self.coronal_viewer.AddObserver("ModifiedEvent", self.update_inputs_from_viewer)
         self.sagittal_viewer.AddObserver("ModifiedEvent", self.update_inputs_from_viewer)
 
+        # 交互器上由本程序注册的 observer，每次打开序列都会重新绑定，由 bindings 保证每个处理函数只注册一次
+        self.bindings = InteractionBindings()
+        # 二维视图的左键只由一个分发器处理，按当前模式交给对应的工具；
+        # 交互样式自带的左键（窗宽窗位）与右键（缩放）操作不再使用，由工具和 Ctrl + 右键缩放代替
+        self.tool_dispatchers = []
+        for interactor in self.slice_views:
+            for event in ("LeftButtonPressEvent", "RightButtonPressEvent", "RightButtonReleaseEvent"):
+                interactor.RemoveObservers(event)
+            self.tool_dispatchers.append(ToolDispatcher(interactor, "LeftButtonPressEvent", self.left_button_tool))
+
         self.mouse_pressed = False
         self.dragging_line = None
         self.hovered_line = None
@@ -494,6 +1901,9 @@ class MainWindow(QMainWindow):
         open_files_action = file_menu.addAction("Open Files")
         open_files_action.triggered.connect(self.open_files)
 
+        open_folder_action = file_menu.addAction("Open Folder")
+        open_folder_action.triggered.connect(self.open_folder)
+
         open_files_action = file_menu.addAction("Compare Files")
         open_files_action.triggered.connect(lambda: self.compare_window("axial"))
 
@@ -582,18 +1992,14 @@ class MainWindow(QMainWindow):
         self.axial_viewer.SetColorLevel(self.color_level)
         self.coronal_viewer.SetColorLevel(self.color_level)
         self.sagittal_viewer.SetColorLevel(self.color_level)
-        self.axial_viewer.Render()
-        self.coronal_viewer.Render()
-        self.sagittal_viewer.Render()
+        self.render_scheduler.request(self.axial_viewer, self.coronal_viewer, self.sagittal_viewer)
 
     def update_contrast(self, value):
         self.color_window = value
         self.axial_viewer.SetColorWindow(self.color_window)
         self.coronal_viewer.SetColorWindow(self.color_window)
         self.sagittal_viewer.SetColorWindow(self.color_window)
-        self.axial_viewer.Render()
-        self.coronal_viewer.Render()
-        self.sagittal_viewer.Render()
+        self.render_scheduler.request(self.axial_viewer, self.coronal_viewer, self.sagittal_viewer)
 
     def enable_marking(self):
         self.picking = False  # 三视图点位联动
@@ -608,17 +2014,22 @@ class MainWindow(QMainWindow):
         if self.marking:
             world_pos = [self.x_input.value(), self.y_input.value(), self.z_input.value()]
 
-            actual_pos = self.add_marker(self.axial_viewer, world_pos)
+            markers = [(viewer, self.create_marker(world_pos))
+                       for viewer in (self.axial_viewer, self.coronal_viewer, self.sagittal_viewer)]
+            actual_pos = markers[0][1].GetCenter()
             print("World: ", world_pos)
             print("Actual: ", actual_pos)
-            self.add_marker(self.coronal_viewer, world_pos)
-            self.add_marker(self.sagittal_viewer, world_pos)
 
             point_name = f"Point {len(self.marked_points) + 1}"
             angle = (self.rotate_x_input.value(), self.rotate_y_input.value(), self.rotate_z_input.value())
             physical_pos = self.update_physical_position_label_map(actual_pos[0], actual_pos[1], actual_pos[2])
 
-            self.marked_points.append((point_name, actual_pos, angle, physical_pos))
+            # 编号从不复用：其他视图中残留的红点不会误删之后新标记的点
+            point_id = next(self.point_ids)
+            self.marked_points[point_id] = (point_name, actual_pos, angle, physical_pos)
+            # 三个视图中的红点都对应这一条记录，擦除其中任一个时从表格中删除
+            for viewer, actor in markers:
+                self.add_annotation(viewer, actor, 'markers', point_id)
 
         self.disable_marking()
 
@@ -642,40 +2053,25 @@ class MainWindow(QMainWindow):
 
     def erase_marker(self, obj, event):
         if self.erasing:
-            click_pos = obj.GetEventPosition()
-            picker = vtk.vtkCellPicker()
             renderer = obj.GetRenderWindow().GetRenderers().GetFirstRenderer()
 
             if renderer is not None:
-                picker.Pick(click_pos[0], click_pos[1], 0, renderer)
-                picked_center = picker.GetPickPosition()
-                picked_actors = self.pick_actors_in_radius(renderer, picked_center, self.erase_radius)
-
+                picked_center = self.pick_on_view(obj)
+                picked_actors = self.scene.query(renderer, picked_center, self.erase_radius)
+
+                for picked_actor in picked_actors:
+                    point_id = self.scene.remove(picked_actor)
+                    # 删除表格中对应的点（同一个点在其他视图中的红点可能已先被擦除）
+                    if point_id is not None:
+                        self.marked_points.pop(point_id, None)
                 if picked_actors:
-                    for picked_actor in picked_actors:
-                        if isinstance(picked_actor, vtk.vtkActor) and picked_actor.GetProperty().GetColor() == (
-                        1, 0, 0):
-                            # 查找并删除表格中对应的点
-                            pos = picked_actor.GetCenter()
-                            self.marked_points = [mp for mp in self.dicom_viewers[self.current_viewer_index].marked_points if mp[1] != pos]
-                        renderer.RemoveActor(picked_actor)
-                        obj.GetRenderWindow().Render()
-
-    def pick_actors_in_radius(self, renderer, pick_position, radius):
-        picked_actors = []
-        actors = renderer.GetActors()
-        actors.InitTraversal()
-        actor = actors.GetNextActor()
+                    self.render_scheduler.request(obj.GetRenderWindow())
 
-        while actor:
-            bounds = actor.GetBounds()
-            center = [(bounds[0] + bounds[1]) / 2, (bounds[2] + bounds[3]) / 2, (bounds[4] + bounds[5]) / 2]
-            distance = np.linalg.norm(np.array(pick_position) - np.array(center))
-            if distance <= radius:
-                picked_actors.append(actor)
-            actor = actors.GetNextActor()
-
-        return picked_actors
+    def pick_on_view(self, interactor):
+        # 鼠标在二维视图当前切片平面上的世界坐标（体素索引坐标），切片取尚未绘制的最新值
+        viewer, axis = self.slice_views[interactor]
+        return pick_on_slice(viewer.GetRenderer(), interactor.GetEventPosition(), axis,
+                             self.render_scheduler.slice(viewer))
 
     # 设置一个自定义的擦除光标
     def set_erase_cursor(self):
@@ -928,8 +2324,10 @@ class MainWindow(QMainWindow):
                                          "Physical Y", "Physical Z"])
         table.setRowCount(len(self.marked_points))
 
-        for i, (name, (x, y, z), (angle_x, angle_y, angle_z), (phy_x, phy_y, phy_z)) in enumerate(self.marked_points):
+        for i, (point_id, (name, (x, y, z), (angle_x, angle_y, angle_z), (phy_x, phy_y, phy_z))) in enumerate(
+                self.marked_points.items()):
             name_item = QTableWidgetItem(name)
+            name_item.setData(Qt.UserRole, point_id)  # 修改名称时按编号找回记录
             name_item.setFlags(Qt.ItemIsEditable | Qt.ItemIsEnabled)
             table.setItem(i, 0, name_item)
             table.setItem(i, 1, QTableWidgetItem(f"{x:.2f}"))
@@ -1214,7 +2612,7 @@ class MainWindow(QMainWindow):
             self.last_distance_label.setText(f"Last Distance: {distance:.2f} mm")
 
         renderer.ResetCamera()
-        renderer.GetRenderWindow().Render()
+        self.render_scheduler.request(renderer)
 
     def display_distance_in_3d(self, renderer, point1, point2, distance):
         text_source = vtk.vtkTextSource()
@@ -1236,7 +2634,7 @@ class MainWindow(QMainWindow):
         text_actor.SetCamera(renderer.GetActiveCamera())
 
         renderer.AddActor(text_actor)
-        renderer.Render()
+        self.render_scheduler.request(renderer)
 
     def add_marker_in_3d(self, renderer, world_pos):
         point_source = vtk.vtkPointSource()
@@ -1258,7 +2656,7 @@ class MainWindow(QMainWindow):
         actor.GetProperty().SetColor(1, 0, 0)  # 红色
 
         renderer.AddActor(actor)
-        renderer.Render()
+        self.render_scheduler.request(renderer)
 
         '''
         actor_center = actor.GetCenter()
@@ -1323,7 +2721,7 @@ class MainWindow(QMainWindow):
         text_actor.SetCamera(renderer.GetActiveCamera())
 
         renderer.AddActor(text_actor)
-        renderer.Render()
+        self.render_scheduler.request(renderer)
 
         if self.measuring_angle:
             self.last_angle_label.setText(f"Last Angle: {angle:.2f} °")
@@ -1335,7 +2733,7 @@ class MainWindow(QMainWindow):
         file_path, _ = file_dialog.getSaveFileName(self, "Save as Excel file", "", "Excel Files (*.xlsx)")
         if file_path:
             data = []
-            for name, point, angle, physical in self.marked_points:
+            for name, point, angle, physical in self.marked_points.values():
                 data.append([name, round(point[0], 2), round(point[1], 2), round(point[2], 2),
                              angle[0], angle[1], angle[2],
                              round(physical[1], 2), round(physical[0], 2), round(physical[2], 2)])
@@ -1488,7 +2886,7 @@ class MainWindow(QMainWindow):
         self.z_line_actor.GetProperty().SetColor(1, 1, 0)
 
         self.renderer_3d.AddActor(self.z_line_actor)
-        self.render_window_3d.Render()
+        self.render_scheduler.request(self.render_window_3d)
 
     def stop_showing_3d(self):
         self.projection_3d = False
@@ -1502,7 +2900,7 @@ class MainWindow(QMainWindow):
         if self.z_line_actor:
             self.renderer_3d.RemoveActor(self.z_line_actor)
 
-        self.render_window_3d.Render()
+        self.render_scheduler.request(self.render_window_3d)
 
     def save_marked_points(self, table, row, column):
         if column == 0:  # Only update if the name column is changed
@@ -1516,9 +2914,11 @@ class MainWindow(QMainWindow):
             phy_x_item = float(table.item(row, 7).text())
             phy_y_item = float(table.item(row, 8).text())
             phy_z_item = float(table.item(row, 9).text())
-            self.marked_points[row] = (name_item, (x_item, y_item, z_item),
-                                       (angle_x_item, angle_y_item, angle_z_item),
-                                       (phy_x_item, phy_y_item, phy_z_item))
+            point_id = table.item(row, 0).data(Qt.UserRole)
+            if point_id in self.marked_points:  # 表格打开期间该点可能已被擦除
+                self.marked_points[point_id] = (name_item, (x_item, y_item, z_item),
+                                                (angle_x_item, angle_y_item, angle_z_item),
+                                                (phy_x_item, phy_y_item, phy_z_item))
 
     def save_key_points(self, table, row, column):
         if column == 0:  # Only update if the name column is changed
@@ -1653,8 +3053,6 @@ class MainWindow(QMainWindow):
         self.key_points = dicom_viewer.key_points
         self.distances = dicom_viewer.distances
         self.angles = dicom_viewer.angles
-        self.markers = dicom_viewer.markers  # 储存现在坐标在三视图上的红点actor
-        self.lines = dicom_viewer.lines  # 储存线条actor
         self.state_snapshots = dicom_viewer.state_snapshots  # 保存最近的三次状态快照
         self.system = dicom_viewer.system
 
@@ -1668,10 +3066,6 @@ class MainWindow(QMainWindow):
         self.last_angle_label.setText(f"Last Angle: {0.00} °")
         self.last_h_angle_label.setText(f"Last Horizontal Angle: {0.00} °")
 
-        self.lr_count = dicom_viewer.lr_count
-        self.fh_count = dicom_viewer.fh_count
-        self.tb_count = dicom_viewer.tb_count
-
     def open_files(self):
         file_dialog = QFileDialog(self, "Select DICOM File(s)")
         file_dialog.setFileMode(QFileDialog.ExistingFiles)
@@ -1680,38 +3074,255 @@ class MainWindow(QMainWindow):
         if file_dialog.exec():
             selected_files = file_dialog.selectedFiles()
             if selected_files:
-                # 判断选择的是单个文件还是多个文件
-                if len(selected_files) == 1:
-                    x = 0  # 单文件
-                else:
-                    x = 1  # 多文件
+                self.load_in_background(selected_files)
 
-                # 创建 DICOMViewer 实例并将其添加到列表
-                dcm = DICOMViewer(selected_files)
-                self.dicom_viewers.append(dcm)  # 将实例添加到列表中
+    def open_folder(self):
+        if self.folder_scanner is not None:
+            QMessageBox.information(self, "提示", "正在扫描文件夹，请稍候")
+            return
+        root = QFileDialog.getExistingDirectory(self, "Select DICOM Folder")
+        if not root:
+            return
 
-                # 更新当前选择的DICOMViewer
-                self.current_viewer_index = len(self.dicom_viewers) - 1  # 默认新打开的
-                # 设置标志位 x
-                self.dicom_viewers[self.current_viewer_index].is_files = x
-                self.param_init(self.dicom_viewers[self.current_viewer_index])
-                self.visualize_vtk_image(self.dicom_viewers[self.current_viewer_index].vtk_image)
+        self.folder_scanner = FolderScanner(self.series_catalog, os.path.abspath(root))
+        self.folder_scanner.progress.connect(self.on_scan_progress)
+        self.folder_scanner.finished.connect(self.on_scan_finished)
+        self.folder_scanner.failed.connect(self.on_scan_failed)
+        if self.loading_viewer is None:
+            self.load_progress.setRange(0, 0)
+            self.load_progress.show()
+        self.folder_scanner.start()
+
+    def on_scan_progress(self, done, total):
+        # 进度条与序列加载共用，加载进行中时不显示扫描进度
+        if self.loading_viewer is None:
+            self.load_progress.setRange(0, total)
+            self.load_progress.setValue(done)
+
+    def on_scan_finished(self, root, series):
+        self.folder_scanner = None
+        if self.loading_viewer is None:
+            self.load_progress.hide()
+        if not series:
+            QMessageBox.information(self, "提示", "文件夹中没有找到 DICOM 序列")
+            return
+        self.show_series_chooser(root, series)
 
-    def switch_image(self):
-        if len(self.dicom_viewers) > 1:
-            self.current_viewer_index = (self.current_viewer_index + 1) % len(self.dicom_viewers)
-            self.param_init(self.dicom_viewers[self.current_viewer_index])
-            self.visualize_vtk_image(self.dicom_viewers[self.current_viewer_index].vtk_image)
+    def on_scan_failed(self, message):
+        self.folder_scanner = None
+        if self.loading_viewer is None:
+            self.load_progress.hide()
+        QMessageBox.information(self, "ERROR", f"文件夹扫描失败：{message}")
+
+    def show_series_chooser(self, root, series):
+        dialog = QDialog(self)
+        dialog.setWindowTitle("Select Series")
+        layout = QVBoxLayout(dialog)
+
+        table = QTableWidget(dialog)
+        table.setColumnCount(8)
+        table.setHorizontalHeaderLabels(["Patient ID", "Patient Name", "Study Date", "Study Description",
+                                         "Series", "Series Description", "Modality", "Files"])
+        table.setRowCount(len(series))
+        table.setEditTriggers(QTableWidget.NoEditTriggers)
+        table.setSelectionBehavior(QTableWidget.SelectRows)
+
+        for i, (series_uid, *columns) in enumerate(series):
+            for j, value in enumerate(columns):
+                table.setItem(i, j, QTableWidgetItem("" if value is None else str(value)))
+        table.resizeColumnsToContents()
+
+        def open_selected():
+            rows = sorted({index.row() for index in table.selectedIndexes()})
+            for row in rows:
+                self.load_in_background(self.series_catalog.files_of(series[row][0], root))
+            if rows:
+                dialog.accept()
+
+        table.cellDoubleClicked.connect(lambda row, column: open_selected())
+        layout.addWidget(table)
 
-            for _ in range(self.lr_count):
-                self.flip_LR_AUTO()
-            for _ in range(self.fh_count):
-                self.flip_FH_AUTO()
-            for _ in range(self.tb_count):
-                self.flip_TB_AUTO()
+        open_button = QPushButton("Open", dialog)
+        open_button.clicked.connect(open_selected)
+        layout.addWidget(open_button)
 
-            if self.system == 1:
-                self.set_coordinate_system()
+        dialog.setLayout(layout)
+        dialog.resize(900, 400)
+        dialog.show()
+
+    def load_in_background(self, filenames, viewer=None, done=None):
+        # 加载放到后台线程，正在加载时新打开的序列排队等待；viewer 为换出的序列时只重新取回其体数据，完成后调用 done
+        self.load_queue.append((filenames, viewer, done))
+        if self.loading_viewer is None:
+            self.start_next_load()
+
+    def restore_in_background(self, dcm, done):
+        """
+        被 VolumeManager 换出的序列在后台线程中重新取回，与新打开的序列共用加载队列，取回后在主线程调用 done。
+        """
+        if dcm is self.loading_viewer or any(viewer is dcm for _, viewer, _ in self.load_queue):
+            return  # 已经在取回
+        self.load_in_background(dcm.series.filenames, dcm, done)
+
+    def start_next_load(self):
+        if not self.load_queue:
+            return
+        filenames, dcm, done = self.load_queue.popleft()
+
+        if dcm is None:
+            dcm = DICOMViewer(cache=self.volume_cache, stream=STREAM_LOADING)
+            # 判断选择的是单个文件还是多个文件
+            dcm.is_files = 0 if len(filenames) == 1 else 1
+            loader = VolumeLoader(filenames, dcm.workers, dcm.cache, dcm.stream)
+        else:
+            loader = VolumeLoader(filenames, dcm.workers, dcm.cache, series=dcm.series)  # 取回时不流式显示
+        dcm.loader = loader
+        self.loading_viewer = dcm
+        self.restore_done = done
+
+        loader.ready.connect(self.on_volume_ready)
+        loader.slab_loaded.connect(self.on_slab_loaded)
+        loader.progress.connect(self.on_load_progress)
+        loader.finished.connect(self.on_load_finished)
+        loader.failed.connect(self.on_load_failed)
+        loader.cancelled.connect(self.on_load_cancelled)
+
+        self.load_progress.setRange(0, 0)  # 读头信息阶段总数未知，显示忙碌状态
+        self.load_progress.show()
+        self.cancel_load_button.show()
+        loader.start()
+
+    def cancel_loading(self):
+        self.load_queue.clear()
+        if self.loading_viewer is not None:
+            self.loading_viewer.loader.cancel()
+
+    def on_volume_ready(self, series, volume):
+        # 唯一在主线程执行的部分：把体数据接入 VTK 并显示
+        dcm = self.loading_viewer
+        if dcm.loader.cancel_event.is_set():
+            return  # 已取消，随后会收到 cancelled
+        if self.restore_done is not None:
+            # 换出后重新取回的序列，标注等状态都还在，只需重新接入体数据
+            dcm.restore_volume(volume)
+            self.restore_done()
+            return
+        dcm.attach_volume(series, volume)
+        self.dicom_viewers.append(dcm)  # 将实例添加到列表中
+        self.show_viewer(dcm)  # 默认显示新打开的
+
+    def show_viewer(self, dcm):
+        # 切换到 dcm 显示，其体数据必须已在内存中
+        self.current_viewer_index = self.dicom_viewers.index(dcm)
+        self.volume_manager.acquire(dcm, self.pinned_viewers())
+        self.param_init(dcm)
+        self.visualize_vtk_image(dcm.vtk_image)
+
+    def pinned_viewers(self):
+        # 当前显示的序列与对比窗口中的两个序列
+        pinned = []
+        if self.current_viewer_index is not None:
+            pinned.append(self.dicom_viewers[self.current_viewer_index])
+        pinned.extend(self.compare_viewers)
+        return pinned
+
+    def is_streaming_current(self):
+        return (self.loading_viewer is not None and self.loading_viewer.loader.streamed
+                and self.current_viewer_index is not None
+                and self.loading_viewer is self.dicom_viewers[self.current_viewer_index])
+
+    def on_slab_loaded(self, z0, z1):
+        if self.is_streaming_current() and not self.stream_refresh_timer.isActive():
+            self.stream_refresh_timer.start()
+
+    def on_load_progress(self, done, total):
+        self.load_progress.setRange(0, total)
+        self.load_progress.setValue(done)
+
+    def on_load_finished(self):
+        if self.loading_viewer.loader.streamed:
+            self.refresh_streamed_volume()
+        self.end_loading()
+
+    def on_load_failed(self, message):
+        self.drop_loading_viewer()
+        self.end_loading()
+        QMessageBox.information(self, "ERROR", f"DICOM 读取失败：{message}")
+
+    def on_load_cancelled(self):
+        self.drop_loading_viewer()
+        self.end_loading()
+
+    def drop_loading_viewer(self):
+        # 流式加载中途失败或取消时，已显示的不完整体数据不能再用于测量，从列表中移除
+        # 取回失败的换出序列则保留在列表中，标注等状态不丢，下次用到时再取回
+        dcm = self.loading_viewer
+        if self.restore_done is not None or dcm not in self.dicom_viewers:
+            return
+        current = self.dicom_viewers[self.current_viewer_index] if self.current_viewer_index is not None else None
+        self.dicom_viewers.remove(dcm)
+        self.volume_manager.forget(dcm)
+        if not self.dicom_viewers:
+            self.current_viewer_index = None
+            self.blank_views()
+        elif current is dcm:
+            # 优先换到仍在内存中的序列；都已换出时先清空视图，在后台取回最后一个再显示
+            resident = [viewer for viewer in self.dicom_viewers if viewer.vtk_image is not None]
+            if resident:
+                self.show_viewer(resident[-1])
+            else:
+                self.current_viewer_index = None
+                self.blank_views()
+                last = self.dicom_viewers[-1]
+                self.restore_in_background(last, lambda: self.show_viewer(last))
+        elif current is not None:
+            self.current_viewer_index = self.dicom_viewers.index(current)
+
+    def blank_views(self):
+        """
+        没有可显示的序列时清空视图：清除标注、隐藏十字线与图像，3D 视图移除全部内容。
+        2D 视图不能 RemoveAllViewProps，否则图像 actor 也被移除，之后打开的序列显示为空白；
+        下次打开序列时 visualize_vtk_image 重新显示图像与十字线。
+        """
+        for viewer in (self.axial_viewer, self.coronal_viewer, self.sagittal_viewer):
+            self.scene.clear(viewer.GetRenderer())
+            viewer.GetImageActor().VisibilityOff()
+            self.render_scheduler.request(viewer)
+        self.scene.set_visible('position', False)
+        self.scene.set_visible('crosshair', False)
+        self.renderer_3d.RemoveAllViewProps()
+        self.render_scheduler.request(self.render_window_3d)
+
+    def end_loading(self):
+        self.loading_viewer.loader = None
+        self.loading_viewer = None
+        self.restore_done = None
+        self.load_progress.hide()
+        self.cancel_load_button.hide()
+        self.start_next_load()
+
+    def refresh_streamed_volume(self):
+        # 源数据被后台线程写入后标记修改，reslice 与 3D 体绘制在下一次渲染时直接重新读取
+        if not self.is_streaming_current():
+            return
+        source = self.loading_viewer.vtk_image
+        source.GetPointData().GetScalars().Modified()
+        source.Modified()
+        self.render_scheduler.request(self.axial_viewer, self.coronal_viewer, self.sagittal_viewer, self.render_window_3d)
+
+    def switch_image(self):
+        if len(self.dicom_viewers) > 1 and self.current_viewer_index is not None:
+            dcm = self.dicom_viewers[(self.current_viewer_index + 1) % len(self.dicom_viewers)]
+            if dcm.vtk_image is None:
+                # 已被换出的序列先在后台取回，取回后再切换过去，期间仍显示当前序列
+                self.restore_in_background(dcm, lambda: self.switch_image_to(dcm))
+            else:
+                self.switch_image_to(dcm)
+
+    def switch_image_to(self, dcm):
+        self.show_viewer(dcm)
+        if self.system == 1:
+            self.set_coordinate_system()
 
     def compare_window(self, view_type):
         """
@@ -1727,9 +3338,22 @@ class MainWindow(QMainWindow):
         dicom_viewer_0 = self.dicom_viewers[0]  # 第一个 DICOMViewer 实例
         dicom_viewer_1 = self.dicom_viewers[1]  # 第二个 DICOMViewer 实例
 
+        # 已被换出的序列先在后台取回，两个都在内存中后再打开窗口；取回期间先固定，避免互相换出
+        for dcm in (dicom_viewer_0, dicom_viewer_1):
+            if dcm.vtk_image is None:
+                self.compare_viewers = [dicom_viewer_0, dicom_viewer_1]
+                self.restore_in_background(dcm, lambda: self.compare_window(view_type))
+                return
+
+        if self.compare_main_window is not None:
+            self.compare_main_window.close()  # 一次只保留一个对比窗口
+        self.compare_viewers = [dicom_viewer_0, dicom_viewer_1]
+
         # 创建并初始化新界面
         new_window = QMainWindow(self)
         new_window.setWindowTitle("Compare DICOM Files")
+        new_window.installEventFilter(self)  # 关闭时释放两个序列，见 eventFilter
+        self.compare_main_window = new_window
 
         # 进行初始化操作
         central_widget = QWidget(new_window)
@@ -1758,7 +3382,7 @@ class MainWindow(QMainWindow):
 
         # 渲染图像
         renderer.ResetCamera()
-        vtk_widget.GetRenderWindow().Render()
+        self.render_scheduler.request(vtk_widget.GetRenderWindow())
         interactor.Initialize()
 
         # 创建视图类型切换按钮
@@ -1780,6 +3404,27 @@ class MainWindow(QMainWindow):
         # 显示新窗口
         new_window.show()
 
+    def eventFilter(self, obj, event):
+        if obj is self.compare_main_window and event.type() == QEvent.Close:
+            self.release_compare_window()
+        return super().eventFilter(obj, event)
+
+    def release_compare_window(self):
+        """
+        对比窗口关闭后断开两个图像 actor 的 reslice 输入，不再持有两个序列的 vtkImageData，
+        它们不再固定在内存中，超出预算时可以换出并真正释放。
+        """
+        for actor in (self.image_actor1, self.image_actor2):
+            if actor is not None:
+                actor.GetMapper().SetInputConnection(None)
+        if self.compare_renderer is not None:
+            self.compare_renderer.RemoveAllViewProps()
+        self.image_actor1 = None
+        self.image_actor2 = None
+        self.compare_main_window = None
+        self.compare_viewers = []
+        self.volume_manager.enforce(self.pinned_viewers())
+
     def create_image_actor(self, dicom_viewer, view_type):
 
         reslice = vtk.vtkImageReslice()
@@ -1829,6 +3474,10 @@ class MainWindow(QMainWindow):
         # 清除渲染器中的所有现有图像
         renderer.RemoveAllViewProps()
 
+        # 两个序列固定在内存中，这里只更新最近使用顺序
+        self.volume_manager.acquire(dicom_viewer_0, self.pinned_viewers() + [dicom_viewer_1])
+        self.volume_manager.acquire(dicom_viewer_1, self.pinned_viewers() + [dicom_viewer_0])
+
         # 创建新的图像actor
         image_actor1 = self.create_image_actor(dicom_viewer_0, self.view_type)
         image_actor2 = self.create_image_actor(dicom_viewer_1, self.view_type)
@@ -1859,7 +3508,7 @@ class MainWindow(QMainWindow):
 
         # 重新渲染
         renderer.ResetCamera()
-        self.compare_vtk_widget.GetRenderWindow().Render()
+        self.render_scheduler.request(self.compare_vtk_widget.GetRenderWindow())
 
     def update_x_value(self):
         """
@@ -1896,139 +3545,73 @@ class MainWindow(QMainWindow):
 
     def add_right_click_zoom_handler(self, interactor, viewer):
         """Add a custom right-click listener for zoom functionality."""
-        """Remove existing right-click observers from the interactor."""
-        events_to_remove = ["RightButtonPressEvent", "RightButtonReleaseEvent"]
-        for event in events_to_remove:
-            interactor.RemoveObservers(event)
-
-        scaling_factor = 0.005  # 缩放速率
-
+        # 交互样式自带的右键操作已在 MainWindow 初始化时移除，这里重复调用也只注册一次
         self.zooming = False
         self.last_y_position = 0
 
-        def on_right_button_press_zoom(obj, event):
-            if interactor.GetControlKey():  # 检查是否按下了 Ctrl 键
-                self.zooming = True
-                self.last_y_position = interactor.GetEventPosition()[1]
-                # Start custom zoom mode
-                print("Zoom mode activated (right-click).")
-
-        def on_mouse_move_zoom(obj, event):
-            if self.zooming:
-                current_y_position = interactor.GetEventPosition()[1]
-                delta_y = current_y_position - self.last_y_position
-                self.last_y_position = current_y_position
-
-                # 获取当前缩放比例
-                current_zoom = viewer.GetRenderer().GetActiveCamera().GetParallelScale()
-                # print(f"Before Zoom: {current_zoom}, Delta Y: {delta_y}")
-
-                # 根据拖动方向调整缩放
-                zoom_factor = 1 - scaling_factor * abs(delta_y)
-                if delta_y > 0:  # 向下拖动缩小
-                    new_zoom = np.abs(current_zoom * zoom_factor)
-                else:  # 向上拖动放大
-                    new_zoom = np.abs(current_zoom / zoom_factor)
-
-                # 限制缩放范围
-                # new_zoom = max(min_zoom, min(new_zoom, max_zoom))
-                # print(f"After Zoom: {new_zoom}")
-
-                # 更新缩放值
-                viewer.GetRenderer().GetActiveCamera().SetParallelScale(new_zoom)
-                viewer.Render()
-
-        def on_right_button_release_zoom(obj, event):
-            self.zooming = False
-            print("Zoom mode deactivated (right-click).")
-
-        interactor.AddObserver("RightButtonPressEvent", on_right_button_press_zoom)
-        interactor.AddObserver("MouseMoveEvent", on_mouse_move_zoom)
-        interactor.AddObserver("RightButtonReleaseEvent", on_right_button_release_zoom)
-        # interactor.AddObserver("LeftButtonReleaseEvent", on_right_button_release_zoom)
-
-    def flip_vtk_image(self, vtk_image, axis):
-        flip = vtk.vtkImageFlip()
-        flip.SetInputData(vtk_image)
-        flip.SetFilteredAxis(axis)  # 0 = x, 1 = y, 2 = z
-        flip.Update()
-        return flip.GetOutput()
-        '''
-        def adjust_orientation(self, vtk_image, image_orientation_patient):
-            iop = self.image_orientation_patient
-            patient_position = self.patient_position
-            print(iop)
-            print(patient_position)
-            1. 根据ImageOrientationPatient调整方向
-            IOP的六个数值分别表示方向向量：
-            iop[0:3] 表示图像行的方向向量，iop[3:6] 表示图像列的方向向量
-            我们根据这些向量来判断图像需要如何翻转和旋转
-
-            2. Axial切片调整
-            if iop == [1, 0, 0, 0, 1, 0]:  # 如果图像已经是Axial方向
-                if patient_position in ['HFS', 'FFS']:  # Head First Supine 或 Feet First Supine
-                    vtk_image = self.flip_vtk_image(vtk_image, 1)  # 翻转Y轴
-                elif patient_position in ['HFP', 'FFP']:  # Head First Prone 或 Feet First Prone
-                    vtk_image = self.flip_vtk_image(vtk_image, 2)  # 翻转Z轴
-
-            3. Coronal切片调整
-            elif iop == [0, 1, 0, 0, 0, 1]:  # 如果图像是Coronal方向
-                if patient_position in ['HFS', 'HFP']:  # Head First Supine 或 Prone
-                    vtk_image = self.flip_vtk_image(vtk_image, 0)  # 翻转X轴
-                elif patient_position in ['FFS', 'FFP']:  # Feet First Supine 或 Prone
-                    vtk_image = self.flip_vtk_image(vtk_image, 2)  # 翻转Z轴
-
-            4. Sagittal切片调整
-            elif iop == [0, 0, 1, 0, 1, 0]:  # 如果图像是Sagittal方向
-                if patient_position in ['HFS', 'HFP']:  # Head First Supine 或 Prone
-                    vtk_image = self.flip_vtk_image(vtk_image, 0)  # 翻转X轴
-                elif patient_position in ['FFS', 'FFP']:  # Feet First Supine 或 Prone
-                    vtk_image = self.flip_vtk_image(vtk_image, 2)  # 翻转Z轴
-
-            return vtk_image
-            '''
-
-    def flip_LR(self):  # 左右镜像
-        self.flipped_image = self.flip_vtk_image(self.flipped_image, 0)
-        self.flip = True
-        self.visualize_vtk_image(self.flipped_image)
-        self.flip = False
+        self.bindings.bind(interactor, "RightButtonPressEvent", self.on_right_button_press_zoom)
+        self.bindings.bind(interactor, "MouseMoveEvent", self.on_mouse_move_zoom)
+        self.bindings.bind(interactor, "RightButtonReleaseEvent", self.on_right_button_release_zoom)
+
+    def on_right_button_press_zoom(self, obj, event):
+        if obj.GetControlKey():  # 检查是否按下了 Ctrl 键
+            self.zooming = True
+            self.last_y_position = obj.GetEventPosition()[1]
+
+    def on_mouse_move_zoom(self, obj, event):
+        if self.zooming:
+            scaling_factor = 0.005  # 缩放速率
+            viewer = self.slice_views[obj][0]
+            current_y_position = obj.GetEventPosition()[1]
+            delta_y = current_y_position - self.last_y_position
+            self.last_y_position = current_y_position
+
+            # 获取当前缩放比例
+            current_zoom = viewer.GetRenderer().GetActiveCamera().GetParallelScale()
+            # print(f"Before Zoom: {current_zoom}, Delta Y: {delta_y}")
+
+            # 根据拖动方向调整缩放
+            zoom_factor = 1 - scaling_factor * abs(delta_y)
+            if delta_y > 0:  # 向下拖动缩小
+                new_zoom = np.abs(current_zoom * zoom_factor)
+            else:  # 向上拖动放大
+                new_zoom = np.abs(current_zoom / zoom_factor)
+
+            # 限制缩放范围
+            # new_zoom = max(min_zoom, min(new_zoom, max_zoom))
+            # print(f"After Zoom: {new_zoom}")
+
+            # 更新缩放值
+            viewer.GetRenderer().GetActiveCamera().SetParallelScale(new_zoom)
+            self.render_scheduler.request(viewer)
+
+    def on_right_button_release_zoom(self, obj, event):
+        self.zooming = False
 
-        self.dicom_viewers[self.current_viewer_index].lr_count = self.dicom_viewers[self.current_viewer_index].lr_count + 1
+    def mirror_display_axis(self, axis):
+        """
+        沿显示坐标的 axis 轴镜像：只切换镜像状态并更新 reslice 与 3D 体绘制的坐标变换，
+        不拷贝体数据，也不重建管线，旋转、标注保持不变。
+        """
+        if self.current_viewer_index is None:
+            return
+        viewer = self.dicom_viewers[self.current_viewer_index]
+        viewer.mirrored[axis] = not viewer.mirrored[axis]
+        self.view_transform.set_orientation(viewer.display_matrix())
+        self.volume_3d.SetUserTransform(self.volume_transform())
+        if self.volume_3d_coarse is not None:
+            self.volume_3d_coarse.SetUserTransform(self.volume_3d.GetUserTransform())
+        self.update_reslice()
+        self.render_scheduler.request(self.render_window_3d)
 
-    def flip_LR_AUTO(self):  # 左右镜像
-        self.flipped_image = self.flip_vtk_image(self.flipped_image, 0)
-        self.flip = True
-        self.visualize_vtk_image(self.flipped_image)
-        self.flip = False
+    def flip_LR(self):  # 左右镜像
+        self.mirror_display_axis(0)
 
     def flip_FH(self):  # 前后镜像
-        self.flipped_image = self.flip_vtk_image(self.flipped_image, 2)
-        self.flip = True
-        self.visualize_vtk_image(self.flipped_image)
-        self.flip = False
-
-        self.dicom_viewers[self.current_viewer_index].fh_count = self.dicom_viewers[self.current_viewer_index].fh_count + 1
-
-    def flip_FH_AUTO(self):  # 前后镜像
-        self.flipped_image = self.flip_vtk_image(self.flipped_image, 2)
-        self.flip = True
-        self.visualize_vtk_image(self.flipped_image)
-        self.flip = False
+        self.mirror_display_axis(1)
 
     def flip_TB(self):  # 上下镜像
-        self.flipped_image = self.flip_vtk_image(self.flipped_image, 1)
-        self.flip = True
-        self.visualize_vtk_image(self.flipped_image)
-        self.flip = False
-
-        self.dicom_viewers[self.current_viewer_index].tb_count = self.dicom_viewers[self.current_viewer_index].tb_count + 1
-
-    def flip_TB_AUTO(self):  # 上下镜像
-        self.flipped_image = self.flip_vtk_image(self.flipped_image, 1)
-        self.flip = True
-        self.visualize_vtk_image(self.flipped_image)
-        self.flip = False
+        self.mirror_display_axis(2)
 
     def rotate_vtk_image(self, vtk_image, angle, axis):
         transform = vtk.vtkTransform()
@@ -2067,23 +3650,8 @@ class MainWindow(QMainWindow):
 
         # 先清除掉以前渲染器中的所有演员
         if not self.first_open:
-            renderer_axial = self.axial_viewer.GetRenderer()
-            axial_removes = self.pick_actors_in_radius(renderer_axial, [0, 0, 0], 2000)
-            if axial_removes:
-                for picked_actor in axial_removes:
-                    renderer_axial.RemoveActor(picked_actor)
-
-            renderer_coronal = self.coronal_viewer.GetRenderer()
-            coronal_removes = self.pick_actors_in_radius(renderer_coronal, [0, 0, 0], 2000)
-            if coronal_removes:
-                for picked_actor in coronal_removes:
-                    renderer_coronal.RemoveActor(picked_actor)
-
-            renderer_sagittal = self.sagittal_viewer.GetRenderer()
-            sagittal_removes = self.pick_actors_in_radius(renderer_sagittal, [0, 0, 0], 2000)
-            if sagittal_removes:
-                for picked_actor in sagittal_removes:
-                    renderer_sagittal.RemoveActor(picked_actor)
+            for viewer in (self.axial_viewer, self.coronal_viewer, self.sagittal_viewer):
+                self.scene.clear(viewer.GetRenderer())
 
             # 初始化变量，控制监听器是否监听任务。
             self.picking = False  # 开启三视图点击联动
@@ -2116,8 +3684,6 @@ class MainWindow(QMainWindow):
             self.set_HtL_button.setStyleSheet("color: black;")
             self.set_origin_button.setStyleSheet("color: black;")
 
-            self.flip = False
-
             self.renderer_3d.RemoveAllViewProps()
 
             self.rotate_x_input.setValue(0)
@@ -2125,15 +3691,12 @@ class MainWindow(QMainWindow):
             self.rotate_z_input.setValue(0)
 
 
-        if not self.flip:
-            self.flipped_image = self.flip_vtk_image(vtk_image, 1)
-            self.flipped_image = self.flip_vtk_image(self.flipped_image, 2)
-        else:
-            self.flipped_image = vtk_image
-
-
-        dimensions = self.flipped_image.GetDimensions()
-        self.width, self.height, self.depth = dimensions
+        # 显示方向与镜像不生成重排后的体数据，而是作为矩阵放进 reslice 与 3D 体绘制的坐标变换，两者直接读取 vtk_image
+        viewer = self.dicom_viewers[self.current_viewer_index]
+        self.flipped_image = vtk_image
+        self.view_reslices = []  # 新的 reslice 建好之前不按旧管线选择层级
+        self.view_producers = {}
+        self.width, self.height, self.depth = viewer.width, viewer.height, viewer.depth
 
         # 更新输入字段的范围
         self.z_input.setRange(0, self.depth - 1)  # Axial
@@ -2148,53 +3711,46 @@ class MainWindow(QMainWindow):
         self.y_input.setValue(middle_coronal)
         self.z_input.setValue(middle_axial)
 
-        self.reslice = vtk.vtkImageReslice()
-        self.reslice.SetInputData(self.flipped_image)
-
-        # 取图像中心坐标
-        self.center = [0] * 3
-        self.flipped_image.GetCenter(self.center)
+        # 取图像中心坐标（显示坐标）
+        self.center = [(self.width - 1) / 2, (self.height - 1) / 2, (self.depth - 1) / 2]
 
-        self.reslice.SetInterpolationModeToLinear()
-        self.reslice.SetOutputSpacing(1, 1, 1)
+        # 显示方向、镜像与绕中心的旋转
+        self.view_transform = ViewTransform(viewer.display_matrix(), self.center)
+        self.view_transform.update()
 
-        # 初始化分别对应X，Y，Z轴的transform对象用于旋转
-        self.transform_x = vtk.vtkTransform()
-        self.transform_y = vtk.vtkTransform()
-        self.transform_z = vtk.vtkTransform()
-
-        # 设置输出范围
-        self.reslice.SetOutputExtent(0, self.width - 1, 0, self.height - 1, 0, self.depth - 1)
+        # 每个视图各用一个 reslice，共用输入与坐标变换。视图只向管线请求正在显示的那一层，
+        # 旋转或翻页时每个视图只重采样自己的一张切片，三个视图之间也不会互相冲掉对方的结果
+        self.axial_reslice = self.create_view_reslice(0)
+        self.coronal_reslice = self.create_view_reslice(1)
+        self.sagittal_reslice = self.create_view_reslice(2)
+        self.view_reslices = [self.axial_reslice, self.coronal_reslice, self.sagittal_reslice]
+        self.view_levels = [1, 1, 1]
+        self.reslice_preview = False
+        self.rotate_refine_timer.stop()
 
         # 使用 vtkResliceImageViewer 显示切片
-        self.axial_viewer.SetInputConnection(self.reslice.GetOutputPort())
+        for viewer in (self.axial_viewer, self.coronal_viewer, self.sagittal_viewer):
+            viewer.GetImageActor().VisibilityOn()
+        self.axial_viewer.SetInputConnection(self.axial_reslice.GetOutputPort())
         self.axial_viewer.SetSliceOrientationToXY()
-        self.axial_viewer.SetSlice(middle_axial)
+        self.render_scheduler.set_slice(self.axial_viewer, middle_axial)
         self.axial_viewer.SetColorWindow(2000)  # 设置初始窗宽（对比度）
         self.axial_viewer.SetColorLevel(-300)  # 设置初始窗位（亮度）
-        self.axial_viewer.Render()
 
-        self.coronal_viewer.SetInputConnection(self.reslice.GetOutputPort())
+        self.coronal_viewer.SetInputConnection(self.coronal_reslice.GetOutputPort())
         self.coronal_viewer.SetSliceOrientationToXZ()
-        self.coronal_viewer.SetSlice(middle_coronal)
+        self.render_scheduler.set_slice(self.coronal_viewer, middle_coronal)
         self.coronal_viewer.SetColorWindow(2000)  # 设置初始窗宽（对比度）
         self.coronal_viewer.SetColorLevel(-300)  # 设置初始窗位（亮度）
-        self.coronal_viewer.Render()
 
-        self.sagittal_viewer.SetInputConnection(self.reslice.GetOutputPort())
+        self.sagittal_viewer.SetInputConnection(self.sagittal_reslice.GetOutputPort())
         self.sagittal_viewer.SetSliceOrientationToYZ()
-        self.sagittal_viewer.SetSlice(middle_sagittal)
+        self.render_scheduler.set_slice(self.sagittal_viewer, middle_sagittal)
         self.sagittal_viewer.SetColorWindow(2000)  # 设置初始窗宽（对比度）
         self.sagittal_viewer.SetColorLevel(-300)  # 设置初始窗位（亮度）
-        self.sagittal_viewer.Render()
 
         # 3D 渲染部分
 
-        # 创建一个 transform 对象来反置坐标轴方向
-        transform = vtk.vtkTransform()
-        # 将 X 轴反置
-        transform.Scale(-1, 1, 1)
-
         volume_mapper = vtk.vtkGPUVolumeRayCastMapper()
         volume_mapper.SetInputData(self.flipped_image)
 
@@ -2220,49 +3776,24 @@ class MainWindow(QMainWindow):
         volume.SetMapper(volume_mapper)
         volume.SetProperty(volume_property)
 
-        volume.SetUserTransform(transform)
+        volume.SetUserTransform(self.volume_transform())
+        self.volume_3d = volume
+        self.volume_3d_coarse = None
 
         self.renderer_3d.AddVolume(volume)
 
         self.setup_camera(self.renderer_3d)
 
-        self.render_window_3d.Render()
-
-        self.render_window_interactor_axial.RemoveObservers("LeftButtonPressEvent")
-        self.render_window_interactor_coronal.RemoveObservers("LeftButtonPressEvent")
-        self.render_window_interactor_sagittal.RemoveObservers("LeftButtonPressEvent")
-
-        self.render_window_interactor_axial.AddObserver("MouseMoveEvent", self.on_mouse_move)
-        self.render_window_interactor_axial.AddObserver("LeftButtonPressEvent", self.on_left_button_press, 114514.0)
-        self.render_window_interactor_axial.AddObserver("LeftButtonReleaseEvent", self.on_left_button_release)
-
-        self.render_window_interactor_coronal.AddObserver("MouseMoveEvent", self.on_mouse_move)
-        self.render_window_interactor_coronal.AddObserver("LeftButtonPressEvent", self.on_left_button_press, 114514.0)
-        self.render_window_interactor_coronal.AddObserver("LeftButtonReleaseEvent", self.on_left_button_release)
+        self.render_scheduler.request(self.render_window_3d)
 
-        self.render_window_interactor_sagittal.AddObserver("MouseMoveEvent", self.on_mouse_move)
-        self.render_window_interactor_sagittal.AddObserver("LeftButtonPressEvent", self.on_left_button_press, 114514.0)
-        self.render_window_interactor_sagittal.AddObserver("LeftButtonReleaseEvent", self.on_left_button_release)
+        self.bindings.bind(self.render_window_interactor_axial, "MouseMoveEvent", self.on_mouse_move)
+        self.bindings.bind(self.render_window_interactor_axial, "LeftButtonReleaseEvent", self.on_left_button_release)
 
-        # 测量两点距离的监听器
-        self.render_window_interactor_axial.AddObserver("LeftButtonPressEvent", self.capture_point)
-        self.render_window_interactor_coronal.AddObserver("LeftButtonPressEvent", self.capture_point)
-        self.render_window_interactor_sagittal.AddObserver("LeftButtonPressEvent", self.capture_point)
+        self.bindings.bind(self.render_window_interactor_coronal, "MouseMoveEvent", self.on_mouse_move)
+        self.bindings.bind(self.render_window_interactor_coronal, "LeftButtonReleaseEvent", self.on_left_button_release)
 
-        # 测量三点角度的监听器
-        self.render_window_interactor_axial.AddObserver("LeftButtonPressEvent", self.capture_angle)
-        self.render_window_interactor_coronal.AddObserver("LeftButtonPressEvent", self.capture_angle)
-        self.render_window_interactor_sagittal.AddObserver("LeftButtonPressEvent", self.capture_angle)
-
-        # 测量水平线角度的监听器
-        self.render_window_interactor_axial.AddObserver("LeftButtonPressEvent", self.capture_angle_horizontal)
-        self.render_window_interactor_coronal.AddObserver("LeftButtonPressEvent", self.capture_angle_horizontal)
-        self.render_window_interactor_sagittal.AddObserver("LeftButtonPressEvent", self.capture_angle_horizontal)
-
-        # 擦除的监听器
-        self.render_window_interactor_axial.AddObserver("LeftButtonPressEvent", self.erase_marker)
-        self.render_window_interactor_coronal.AddObserver("LeftButtonPressEvent", self.erase_marker)
-        self.render_window_interactor_sagittal.AddObserver("LeftButtonPressEvent", self.erase_marker)
+        self.bindings.bind(self.render_window_interactor_sagittal, "MouseMoveEvent", self.on_mouse_move)
+        self.bindings.bind(self.render_window_interactor_sagittal, "LeftButtonReleaseEvent", self.on_left_button_release)
 
         self.add_right_click_zoom_handler(self.render_window_interactor_axial, self.axial_viewer)
 
@@ -2270,11 +3801,11 @@ class MainWindow(QMainWindow):
 
         self.add_right_click_zoom_handler(self.render_window_interactor_sagittal, self.sagittal_viewer)
 
-        self.render_window_interactor_axial.AddObserver("RightButtonPressEvent", self.show_minimenu)
-        self.render_window_interactor_coronal.AddObserver("RightButtonPressEvent", self.show_minimenu)
-        self.render_window_interactor_sagittal.AddObserver("RightButtonPressEvent", self.show_minimenu)
+        self.bindings.bind(self.render_window_interactor_axial, "RightButtonPressEvent", self.show_minimenu)
+        self.bindings.bind(self.render_window_interactor_coronal, "RightButtonPressEvent", self.show_minimenu)
+        self.bindings.bind(self.render_window_interactor_sagittal, "RightButtonPressEvent", self.show_minimenu)
 
-        self.render_window_interactor_3d.AddObserver("LeftButtonPressEvent", self.projection_back)
+        self.bindings.bind(self.render_window_interactor_3d, "LeftButtonPressEvent", self.projection_back)
 
         self.render_window_interactor_axial.Initialize()
         self.render_window_interactor_coronal.Initialize()
@@ -2292,7 +3823,7 @@ class MainWindow(QMainWindow):
         self.renderer_3d.RemoveActor(self.yz_plane_3d_actor)
         self.renderer_3d.RemoveActor(self.xz_plane_3d_actor)
 
-        self.render_window_3d.Render()
+        self.render_scheduler.request(self.render_window_3d)
         # 显示3D映射
         if self.projection_3d:
             self.show_slice_position_in_3d()
@@ -2301,117 +3832,35 @@ class MainWindow(QMainWindow):
 
 
     def update_views(self):
-        # 清除旧的标记和线条
-        self.clear_marker_and_line()
-        # 添加新的标记和线条
+        # 移动标记和十字线到新位置
         x = self.x_input.value()
         y = self.y_input.value()
         z = self.z_input.value()
 
         self.add_marker_with_lines(x, y, z)
 
-        self.axial_viewer.SetSlice(z)
-        self.coronal_viewer.SetSlice(y)
-        self.sagittal_viewer.SetSlice(x)
-
-        self.axial_viewer.Render()
-        self.coronal_viewer.Render()
-        self.sagittal_viewer.Render()
+        self.render_scheduler.set_slice(self.axial_viewer, z)
+        self.render_scheduler.set_slice(self.coronal_viewer, y)
+        self.render_scheduler.set_slice(self.sagittal_viewer, x)
         self.update_physical_position_label_map(x, y, z)
         if self.projection_3d:
             self.show_slice_position_in_3d()
 
     def add_marker_with_lines(self, x, y, z):
-
-        for viewer, orientation in zip(
-                [self.axial_viewer, self.coronal_viewer, self.sagittal_viewer],
-                ['axial', 'coronal', 'sagittal']):
-            renderer = viewer.GetRenderer()
-
-            # 创建红点
-            point_source = vtk.vtkPointSource()
-            point_source.SetCenter(x, y, z)
-            point_source.SetNumberOfPoints(1)
-
-            sphere_source = vtk.vtkSphereSource()
-            sphere_source.SetRadius(3.0)
-
-            glyph = vtk.vtkGlyph3D()
-            glyph.SetSourceConnection(sphere_source.GetOutputPort())
-            glyph.SetInputConnection(point_source.GetOutputPort())
-
-            mapper = vtk.vtkPolyDataMapper()
-            mapper.SetInputConnection(glyph.GetOutputPort())
-
-            actor = vtk.vtkActor()
-            actor.SetMapper(mapper)
-            actor.GetProperty().SetColor(1, 1, 0)  # 黄色
-
-            renderer.AddActor(actor)
-            self.markers.append(actor)
-
-            # 创建X轴平行线
-            line_source_horizontal = vtk.vtkLineSource()
-            if orientation == 'axial':
-                line_source_horizontal.SetPoint1(0, y, z)
-                line_source_horizontal.SetPoint2(self.width - 1, y, z)
-            elif orientation == 'coronal':
-                line_source_horizontal.SetPoint1(0, y, z)
-                line_source_horizontal.SetPoint2(self.width - 1, y, z)
-            elif orientation == 'sagittal':
-                line_source_horizontal.SetPoint1(x, 0, z)
-                line_source_horizontal.SetPoint2(x, self.height - 1, z)
-
-            line_mapper_horizontal = vtk.vtkPolyDataMapper()
-            line_mapper_horizontal.SetInputConnection(line_source_horizontal.GetOutputPort())
-
-            line_actor_horizontal = vtk.vtkActor()
-            line_actor_horizontal.SetMapper(line_mapper_horizontal)
-            if self.picking:
-                line_actor_horizontal.GetProperty().SetColor(0, 0, 1)  # 蓝色
-            else:
-                line_actor_horizontal.GetProperty().SetColor(0, 1, 0)  # 绿色
-
-            renderer.AddActor(line_actor_horizontal)
-            self.lines.append(line_actor_horizontal)
-
-            # 创建Y轴平行线
-            line_source_vertical = vtk.vtkLineSource()
-            if orientation == 'axial':
-                line_source_vertical.SetPoint1(x, 0, z)
-                line_source_vertical.SetPoint2(x, self.height - 1, z)
-            elif orientation == 'coronal':
-                line_source_vertical.SetPoint1(x, y, 0)
-                line_source_vertical.SetPoint2(x, y, self.depth - 1)
-            elif orientation == 'sagittal':
-                line_source_vertical.SetPoint1(x, y, 0)
-                line_source_vertical.SetPoint2(x, y, self.depth - 1)
-
-            line_mapper_vertical = vtk.vtkPolyDataMapper()
-            line_mapper_vertical.SetInputConnection(line_source_vertical.GetOutputPort())
-
-            line_actor_vertical = vtk.vtkActor()
-            line_actor_vertical.SetMapper(line_mapper_vertical)
-            if self.picking:
-                line_actor_vertical.GetProperty().SetColor(0, 0, 1)  # 蓝色
-            else:
-                line_actor_vertical.GetProperty().SetColor(0, 1, 0)  # 绿色
-
-            renderer.AddActor(line_actor_vertical)
-            self.lines.append(line_actor_vertical)
-
-            viewer.Render()
+        # 原地移动十字线并显示，不重建管线
+        color = (0, 0, 1) if self.picking else (0, 1, 0)  # 拾取时蓝色，否则绿色
+        for crosshair in self.crosshairs:
+            crosshair.update((x, y, z), (self.width, self.height, self.depth), color)
+        self.scene.set_visible('position', True)
+        self.scene.set_visible('crosshair', True)
+        self.render_scheduler.request(self.axial_viewer, self.coronal_viewer, self.sagittal_viewer)
 
     # 检测鼠标是否接近辅助线,当鼠标按下并拖动时，更新对应的坐标值并刷新视图
     def on_mouse_move(self, obj, event):
         if not (self.marking) and not (self.erasing) and not (self.measuring) and not (self.measuring_angle) and not (
         self.picking):
             interactor = obj
-            mouse_pos = interactor.GetEventPosition()
-            picker = vtk.vtkWorldPointPicker()
-            picker.Pick(mouse_pos[0], mouse_pos[1], 0, interactor.GetRenderWindow().GetRenderers().GetFirstRenderer())
-            mouse_world_pos = picker.GetPickPosition()
-            x, y, z = mouse_world_pos
+            x, y, z = self.pick_on_view(interactor)
 
             # 假设axial面上的横轴和纵轴的位置分别是self.x_line_pos和self.y_line_pos
             x_line_pos = self.x_input.value()
@@ -2457,15 +3906,29 @@ class MainWindow(QMainWindow):
 
             if self.mouse_pressed and self.dragging_line:
                 if self.dragging_line == 'y':
-                    self.y_input.setValue(y)
+                    self.y_input.setValue(round(y))
                     self.update_views()
                 elif self.dragging_line == 'x':
-                    self.x_input.setValue(x)
+                    self.x_input.setValue(round(x))
                     self.update_views()
                 elif self.dragging_line == 'z':
-                    self.z_input.setValue(z)
+                    self.z_input.setValue(round(z))
                     self.update_views()
 
+    def left_button_tool(self):
+        # 左键当前对应的工具；几个模式同时打开时按这里的顺序只取一个，都没打开时拖动十字线
+        if self.erasing:
+            return self.erase_marker
+        if self.measuring:
+            return self.capture_point
+        if self.measuring_angle:
+            return self.capture_angle
+        if self.measuring_horizontal_angle:
+            return self.capture_angle_horizontal
+        if self.picking:
+            return self.pick_point
+        return self.on_left_button_press
+
     def on_left_button_press(self, obj, event):
         if self.hovered_line:
             self.mouse_pressed = True
@@ -2476,35 +3939,27 @@ class MainWindow(QMainWindow):
         self.dragging_line = None
 
     def clear_markers(self):
-        for viewer in [self.axial_viewer, self.coronal_viewer, self.sagittal_viewer]:
-            renderer = viewer.GetRenderer()
-            for marker in self.markers:
-                renderer.RemoveActor(marker)
-            viewer.Render()
-        self.markers = []
+        self.scene.set_visible('position', False)
+        self.render_scheduler.request(self.axial_viewer, self.coronal_viewer, self.sagittal_viewer)
 
     def clear_lines(self):
-        for viewer in [self.axial_viewer, self.coronal_viewer, self.sagittal_viewer]:
-            renderer = viewer.GetRenderer()
-            for marker in self.lines:
-                renderer.RemoveActor(marker)
-            viewer.Render()
-        self.lines = []
+        self.scene.set_visible('crosshair', False)
+        self.render_scheduler.request(self.axial_viewer, self.coronal_viewer, self.sagittal_viewer)
 
     def clear_marker_and_line(self):
         self.clear_markers()
         self.clear_lines()
 
     def update_inputs_from_viewer(self, obj, event):
-        self.z_input.setValue(self.axial_viewer.GetSlice())
-        self.y_input.setValue(self.coronal_viewer.GetSlice())
-        self.x_input.setValue(self.sagittal_viewer.GetSlice())
+        self.z_input.setValue(self.render_scheduler.slice(self.axial_viewer))
+        self.y_input.setValue(self.render_scheduler.slice(self.coronal_viewer))
+        self.x_input.setValue(self.render_scheduler.slice(self.sagittal_viewer))
         self.update_physical_position_label_map(self.x_input.value(), self.y_input.value(), self.z_input.value())
 
     def update_inputs_from_image(self):
-        self.z_input.setValue(self.axial_viewer.GetSlice())
-        self.y_input.setValue(self.coronal_viewer.GetSlice())
-        self.x_input.setValue(self.sagittal_viewer.GetSlice())
+        self.z_input.setValue(self.render_scheduler.slice(self.axial_viewer))
+        self.y_input.setValue(self.render_scheduler.slice(self.coronal_viewer))
+        self.x_input.setValue(self.render_scheduler.slice(self.sagittal_viewer))
 
     def picking_switch(self):
         # 设置交互器捕获鼠标事件
@@ -2516,9 +3971,6 @@ class MainWindow(QMainWindow):
             self.pick_label.setStyleSheet("color: black;")
             self.update_views()
         else:
-            self.render_window_interactor_axial.AddObserver("LeftButtonPressEvent", self.pick_point)
-            self.render_window_interactor_coronal.AddObserver("LeftButtonPressEvent", self.pick_point)
-            self.render_window_interactor_sagittal.AddObserver("LeftButtonPressEvent", self.pick_point)
             self.picking = True
             self.update_views()
             QApplication.setOverrideCursor(Qt.CrossCursor)
@@ -2527,15 +3979,11 @@ class MainWindow(QMainWindow):
 
     def pick_point(self, obj, event):
         if self.picking:
-            click_pos = obj.GetEventPosition()
-            picker = vtk.vtkCellPicker()
-
             # 确保渲染器存在
             renderer = obj.GetRenderWindow().GetRenderers().GetFirstRenderer()
             if renderer is not None:
                 self.save_state_snapshot()
-                picker.Pick(click_pos[0], click_pos[1], 0, renderer)
-                world_pos = picker.GetPickPosition()
+                world_pos = self.pick_on_view(obj)
                 self.coord_label.setText(f"Coordinates: ({world_pos[0]:.2f}, {world_pos[1]:.2f}, {world_pos[2]:.2f})")
                 if obj == self.render_window_interactor_axial:
                     self.x_input.setValue(round(world_pos[0]))
@@ -2550,28 +3998,19 @@ class MainWindow(QMainWindow):
 
     def rotate_x(self, value):
         self.save_state_snapshot()
-        self.transform_x.Identity()
-        self.transform_x.Translate(self.center)
-        self.transform_x.RotateX(value)
-        self.transform_x.Translate(-self.center[0], -self.center[1], -self.center[2])
+        self.view_transform.set_angle(0, value)
         self.rotate_x_input.setValue(value)
         self.update_reslice()
 
     def rotate_y(self, value):
         self.save_state_snapshot()
-        self.transform_y.Identity()
-        self.transform_y.Translate(self.center)
-        self.transform_y.RotateY(value)
-        self.transform_y.Translate(-self.center[0], -self.center[1], -self.center[2])
+        self.view_transform.set_angle(1, value)
         self.rotate_y_input.setValue(value)
         self.update_reslice()
 
     def rotate_z(self, value):
         self.save_state_snapshot()
-        self.transform_z.Identity()
-        self.transform_z.Translate(self.center)
-        self.transform_z.RotateZ(value)
-        self.transform_z.Translate(-self.center[0], -self.center[1], -self.center[2])
+        self.view_transform.set_angle(2, value)
         self.rotate_z_input.setValue(value)
         self.update_reslice()
 
@@ -2581,6 +4020,7 @@ class MainWindow(QMainWindow):
             value = 0
         elif value == -1:
             value = 359
+        self.preview_reslice()
         self.rotate_x(value)
         # self.rotate_x_dial.setValue(value)
         self.rotate_x_input.setValue(value)
@@ -2591,6 +4031,7 @@ class MainWindow(QMainWindow):
             value = 0
         elif value == -1:
             value = 359
+        self.preview_reslice()
         self.rotate_y(value)
         # self.rotate_y_dial.setValue(value)
         self.rotate_y_input.setValue(value)
@@ -2601,19 +4042,188 @@ class MainWindow(QMainWindow):
             value = 0
         elif value == -1:
             value = 359
+        self.preview_reslice()
         self.rotate_z(value)
         # self.rotate_z_dial.setValue(value)
         self.rotate_z_input.setValue(value)
 
+    def update_view_pipelines(self):
+        """
+        三个视图的 reslice 与窗宽窗位映射互不依赖，打开 CONCURRENT_VIEW_UPDATES 时在线程池中按各自显示的范围同时更新，
+        随后的 Render 只需绘制；默认不做，各视图在自己的 Render 中依次更新。
+        """
+        if self.view_update_pool is None or not self.view_reslices:
+            return
+        futures = [self.view_update_pool.submit(viewer.GetWindowLevel().UpdateExtent,
+                                                viewer.GetImageActor().GetDisplayExtent())
+                   for viewer in (self.axial_viewer, self.coronal_viewer, self.sagittal_viewer)]
+        for future in futures:
+            future.result()
+
+    def create_view_reslice(self, index):
+        # 输出范围是整个显示坐标下的体数据，实际只计算视图请求的切片
+        reslice = threaded(vtk.vtkImageReslice())
+        reslice.SetInputConnection(self.view_input(index, 1))
+        reslice.SetResliceAxes(self.view_transform.vtk_matrix)
+        reslice.SetInterpolationModeToLinear()
+        set_reslice_output(reslice, (self.width, self.height, self.depth), (1, 1, 1))
+        return reslice
+
+    def set_reslice_preview(self, preview):
+        """
+        切换三个视图 reslice 的预览模式：切片平面内的输出间距放大 ROTATE_PREVIEW_SHRINK 倍并改用最近邻插值，
+        切片方向保持原间距，视图的层号与世界坐标不变。
+        """
+        if preview == self.reslice_preview:
+            return
+        self.reslice_preview = preview
+        for index in range(3):
+            self.configure_view_reslice(index)
+
+    def configure_view_reslice(self, index):
+        # 按金字塔层级与预览模式设置视图 reslice 的输入、切片平面内的输出间距与插值方式
+        factor = self.view_levels[index]
+        reslice = self.view_reslices[index]
+        reslice.SetInputConnection(self.view_input(index, factor))
+
+        sampling = max(factor, ROTATE_PREVIEW_SHRINK if self.reslice_preview else 1)
+        plane = ((0, 1), (0, 2), (1, 2))[index]
+        spacing = [sampling if axis in plane else 1 for axis in range(3)]
+        set_reslice_output(reslice, (self.width, self.height, self.depth), spacing)
+        if self.reslice_preview:
+            reslice.SetInterpolationModeToNearestNeighbor()
+        else:
+            reslice.SetInterpolationModeToLinear()
+        (self.axial_viewer, self.coronal_viewer, self.sagittal_viewer)[index].UpdateDisplayExtent()
+
+    def view_input(self, index, factor):
+        """
+        视图 reslice 在 factor 级的输入端口。每个视图、每个层级只建一个 producer 并缓存，
+        切回用过的层级时连接不变，reslice 不会因此被标记为已修改而重新计算。
+        """
+        key = (index, factor)
+        if key not in self.view_producers:
+            if factor > 1:
+                image = self.dicom_viewers[self.current_viewer_index].pyramid.level(factor)
+            else:
+                image = self.flipped_image
+            producer = vtk.vtkTrivialProducer()
+            producer.SetOutput(pipeline_input(image))
+            self.view_producers[key] = producer
+        return self.view_producers[key].GetOutputPort()
+
+    def view_level(self, viewer):
+        """
+        由平行投影的缩放与窗口高度估算每个屏幕像素覆盖的体素数，取不超过它的 2 的幂作为金字塔层级。
+        放大到一个体素不止一个像素时用原分辨率。
+        """
+        if self.is_streaming_current():
+            return 1  # 流式加载中的体数据还在变化，不生成金字塔
+        height = viewer.GetRenderWindow().GetSize()[1]
+        voxels_per_pixel = 2 * viewer.GetRenderer().GetActiveCamera().GetParallelScale() / max(1, height)
+        pyramid = self.dicom_viewers[self.current_viewer_index].pyramid
+        factor = 1
+        while factor * 2 <= min(voxels_per_pixel, pyramid.max_factor):
+            factor *= 2
+        return pyramid.fit(factor)
+
+    def prepare_view_render(self, target):
+        # render_scheduler 绘制每个视图之前调用：缩放变化后先切换金字塔层级，再开始绘制
+        views = (self.axial_viewer, self.coronal_viewer, self.sagittal_viewer)
+        if target not in views or not self.view_reslices or self.current_viewer_index is None:
+            return
+        index = views.index(target)
+        factor = self.view_level(target)
+        if factor == self.view_levels[index]:
+            return
+        pyramid = self.dicom_viewers[self.current_viewer_index].pyramid
+        if not pyramid.ready(factor):
+            # 层级还没生成时在后台生成，生成好之前继续用当前层级绘制
+            self.build_pyramid_level(pyramid, factor)
+            return
+        self.view_levels[index] = factor
+        self.configure_view_reslice(index)
+
+    def build_pyramid_level(self, pyramid, factor):
+        if self.pyramid_builder is not None:
+            return  # 一次只生成一级，完成后重新绘制时再按需生成下一级
+        builder = PyramidBuilder(pyramid, factor)
+        builder.built.connect(self.on_pyramid_level_built)
+        builder.failed.connect(self.on_pyramid_level_failed)
+        self.pyramid_builder = builder
+        builder.start()
+
+    def on_pyramid_level_built(self, pyramid, factor, array):
+        self.pyramid_builder = None
+        pyramid.add(factor, array)
+        if self.current_viewer_index is None or pyramid is not self.dicom_viewers[self.current_viewer_index].pyramid:
+            return  # 已经换了序列或体数据已被换出，层级留在原来的金字塔里
+        # 重新绘制，prepare_view_render 切换到刚生成的层级
+        for viewer in (self.axial_viewer, self.coronal_viewer, self.sagittal_viewer):
+            self.render_scheduler.request(viewer)
+
+    def on_pyramid_level_failed(self, message):
+        self.pyramid_builder = None
+
+    def on_3d_interaction_start(self, obj, event):
+        # 第一次交互时才在后台生成低分辨率体数据，与原分辨率各用一个映射器，切换时不必重新上传纹理
+        if self.volume_3d is None or self.current_viewer_index is None or self.is_streaming_current():
+            return
+        if self.volume_3d_coarse is None:
+            pyramid = self.dicom_viewers[self.current_viewer_index].pyramid
+            factor = pyramid.level_for_voxels(VOLUME_LOD_VOXELS)
+            if factor == 1:
+                return  # 体数据本来就小，不需要替换
+            if not pyramid.ready(factor):
+                # 在后台生成，这一次交互仍用原分辨率
+                self.build_pyramid_level(pyramid, factor)
+                return
+            mapper = vtk.vtkGPUVolumeRayCastMapper()
+            mapper.SetInputData(pyramid.level(factor))
+            self.volume_3d_coarse = vtk.vtkVolume()
+            self.volume_3d_coarse.SetMapper(mapper)
+            self.volume_3d_coarse.SetProperty(self.volume_3d.GetProperty())
+            self.volume_3d_coarse.SetUserTransform(self.volume_3d.GetUserTransform())
+            self.volume_3d_coarse.PickableOff()
+            self.renderer_3d.AddVolume(self.volume_3d_coarse)
+        self.volume_3d.VisibilityOff()
+        self.volume_3d_coarse.VisibilityOn()
+
+    def on_3d_interaction_end(self, obj, event):
+        if self.volume_3d is None or self.volume_3d_coarse is None:
+            return
+        self.volume_3d_coarse.VisibilityOff()
+        self.volume_3d.VisibilityOn()
+        self.render_scheduler.request(self.render_window_3d)
+
+    def preview_reslice(self):
+        # 旋转输入框的值变化时调用：切到预览模式，并推迟原分辨率计算
+        if self.current_viewer_index is None or not self.view_reslices:
+            return
+        self.set_reslice_preview(True)
+        self.rotate_refine_timer.start()
+
+    def refine_reslice(self):
+        if not self.reslice_preview:
+            return
+        self.set_reslice_preview(False)
+        self.update_view_pipelines()
+        self.render_scheduler.request(self.axial_viewer, self.coronal_viewer, self.sagittal_viewer)
+
+    def volume_transform(self):
+        # 3D 体绘制的坐标变换：先从体素索引转到显示坐标，再将 X 轴反置
+        display_from_index = vtk.vtkMatrix4x4()
+        vtk.vtkMatrix4x4.Invert(self.view_transform.orientation, display_from_index)
+        transform = vtk.vtkTransform()
+        transform.Scale(-1, 1, 1)
+        transform.Concatenate(display_from_index)
+        return transform
+
     def update_reslice(self):
-        combined_transform = vtk.vtkTransform()
-        combined_transform.Concatenate(self.transform_z)
-        combined_transform.Concatenate(self.transform_y)
-        combined_transform.Concatenate(self.transform_x)
-        self.reslice.SetResliceAxes(combined_transform.GetMatrix())
-        self.axial_viewer.Render()
-        self.coronal_viewer.Render()
-        self.sagittal_viewer.Render()
+        # 各视图的 reslice 共用 view_transform.vtk_matrix，角度或方向有变化时这里原地更新一次
+        self.view_transform.update()
+        self.update_view_pipelines()
+        self.render_scheduler.request(self.axial_viewer, self.coronal_viewer, self.sagittal_viewer)
 
     # 这个方法接受的是转前的世界坐标，返回的是转后的世界坐标,这里是以center为中心，欧拉角
     def calculate_position_in_key_coordinates(self, x, y, z, angle_x, angle_y, angle_z):
@@ -2678,6 +4288,13 @@ class MainWindow(QMainWindow):
         return pos2
 
     def closeEvent(self, event):
+        self.cancel_loading()
+        if decode_pool is not None:
+            decode_pool.shutdown(wait=False, cancel_futures=True)
+        if self.view_update_pool is not None:
+            self.view_update_pool.shutdown(wait=False)
+        self.render_scheduler.cancel()
+
         # Finalize all render windows
         self.render_window_axial.Finalize()
         self.render_window_coronal.Finalize()
@@ -2702,8 +4319,6 @@ class MainWindow(QMainWindow):
 
     def capture_point(self, obj, event):
         if self.measuring:
-            click_pos = obj.GetEventPosition()
-            picker = vtk.vtkCellPicker()
             renderer = obj.GetRenderWindow().GetRenderers().GetFirstRenderer()
             if obj == self.render_window_interactor_axial:
                 self.current_viewer = self.axial_viewer
@@ -2712,8 +4327,7 @@ class MainWindow(QMainWindow):
             elif obj == self.render_window_interactor_sagittal:
                 self.current_viewer = self.sagittal_viewer
             if renderer is not None:
-                picker.Pick(click_pos[0], click_pos[1], 0, renderer)
-                world_pos = picker.GetPickPosition()
+                world_pos = self.pick_on_view(obj)
 
                 if self.click == 0:
                     self.point1 = world_pos
@@ -2754,8 +4368,6 @@ class MainWindow(QMainWindow):
 
     def capture_angle(self, obj, event):
         if self.measuring_angle:
-            click_pos = obj.GetEventPosition()
-            picker = vtk.vtkCellPicker()
             renderer = obj.GetRenderWindow().GetRenderers().GetFirstRenderer()
             if obj == self.render_window_interactor_axial:
                 self.current_viewer = self.axial_viewer
@@ -2764,8 +4376,7 @@ class MainWindow(QMainWindow):
             elif obj == self.render_window_interactor_sagittal:
                 self.current_viewer = self.sagittal_viewer
             if renderer is not None:
-                picker.Pick(click_pos[0], click_pos[1], 0, renderer)
-                world_pos = picker.GetPickPosition()
+                world_pos = self.pick_on_view(obj)
                 if self.click == 0:
                     self.point1 = world_pos
                     self.add_marker(self.current_viewer, world_pos)
@@ -2789,8 +4400,6 @@ class MainWindow(QMainWindow):
 
     def capture_angle_horizontal(self, obj, event):
         if self.measuring_horizontal_angle:
-            click_pos = obj.GetEventPosition()
-            picker = vtk.vtkCellPicker()
             renderer = obj.GetRenderWindow().GetRenderers().GetFirstRenderer()
             if obj == self.render_window_interactor_axial:
                 self.current_viewer = self.axial_viewer
@@ -2799,8 +4408,7 @@ class MainWindow(QMainWindow):
             elif obj == self.render_window_interactor_sagittal:
                 self.current_viewer = self.sagittal_viewer
             if renderer is not None:
-                picker.Pick(click_pos[0], click_pos[1], 0, renderer)
-                world_pos = picker.GetPickPosition()
+                world_pos = self.pick_on_view(obj)
                 if self.click == 0:
                     self.point1 = world_pos
                     self.add_marker(self.current_viewer, world_pos)
@@ -2860,8 +4468,7 @@ class MainWindow(QMainWindow):
         text_actor.GetProperty().SetColor(1.0, 0.0, 0.0)
         text_actor.SetCamera(self.current_viewer.GetRenderer().GetActiveCamera())
 
-        self.current_viewer.GetRenderer().AddActor(text_actor)
-        self.current_viewer.Render()
+        self.add_annotation(self.current_viewer, text_actor, 'text')
 
         angle_name = f"Angle {len(self.marked_points) + 1}"
 
@@ -2894,6 +4501,18 @@ class MainWindow(QMainWindow):
         return angle_degrees
 
     def add_marker(self, viewer, world_pos):
+        actor = self.create_marker(world_pos)
+        self.add_annotation(viewer, actor, 'markers')
+        return actor.GetCenter()
+        # 红点的实际中心与点击位置有非常细微的差距，推测是由于浮点计算的精度问题导致，目前未找到解决办法
+        # 所以最终选择将红点实际中心返还并加入表格中，以确保图像中红点中心与表格对齐，特此注明
+
+    def add_annotation(self, viewer, actor, layer, record_key=None):
+        # 标注 actor 加入视图并登记到对应图层，擦除时按位置查找
+        self.scene.add(viewer.GetRenderer(), actor, layer, record_key)
+        self.render_scheduler.request(viewer)
+
+    def create_marker(self, world_pos):
         point_source = vtk.vtkPointSource()
         point_source.SetCenter(world_pos)
         point_source.SetNumberOfPoints(1)
@@ -2912,16 +4531,7 @@ class MainWindow(QMainWindow):
         actor.SetMapper(mapper)
         actor.GetProperty().SetColor(1, 0, 0)  # 红色
 
-        # self.mark_point_markers.append(actor)
-
-        viewer.GetRenderer().AddActor(actor)
-        viewer.Render()
-
-        actor_center = actor.GetCenter()
-
-        return actor_center
-        # 红点的实际中心与点击位置有非常细微的差距，推测是由于浮点计算的精度问题导致，目前未找到解决办法
-        # 所以最终选择将红点实际中心返还并加入表格中，以确保图像中红点中心与表格对齐，特此注明
+        return actor
 
     def add_plane(self, normal, point):
         # 创建平面源
@@ -2956,7 +4566,7 @@ class MainWindow(QMainWindow):
         # 添加平面到渲染器
         self.renderer_3d.AddActor(actor)
 
-        self.render_window_3d.Render()
+        self.render_scheduler.request(self.render_window_3d)
         return actor
 
     def draw_line_and_measure(self, point1, point2, drawing):
@@ -2973,7 +4583,7 @@ class MainWindow(QMainWindow):
         line_actor.GetProperty().SetColor(0, 1, 0)  # 绿色
 
         if drawing:
-            self.current_viewer.GetRenderer().AddActor(line_actor)
+            self.add_annotation(self.current_viewer, line_actor, 'measurements')
 
         # 计算距离
         if self.measuring and not self.measuring_angle and not self.measuring_horizontal_angle:
@@ -2985,7 +4595,7 @@ class MainWindow(QMainWindow):
             self.last_distance_label.setText(f"Last Distance: {distance:.2f} mm")
 
 
-        self.current_viewer.Render()
+        self.render_scheduler.request(self.current_viewer)
 
     def display_distance(self, viewer, point1, point2, distance):
         text_source = vtk.vtkTextSource()
@@ -3010,8 +4620,7 @@ class MainWindow(QMainWindow):
         text_actor.GetProperty().SetColor(1.0, 0.0, 0.0)
         text_actor.SetCamera(viewer.GetRenderer().GetActiveCamera())
 
-        viewer.GetRenderer().AddActor(text_actor)
-        viewer.Render()
+        self.add_annotation(viewer, text_actor, 'text')
 
     # 求SR以center为中心转后的世界坐标，欧拉角
     def set_physical_origin(self):
@@ -3035,33 +4644,8 @@ class MainWindow(QMainWindow):
     def rotate_coordinate(self, x, y, z, angle_x, angle_y, angle_z, reverse_turn=False):
         """旋转坐标点"""
 
-        # 将角度从度转换为弧度
-        angle_x = np.radians(angle_x)
-        angle_y = np.radians(angle_y)
-        angle_z = np.radians(angle_z)
-
-        # 绕X、Y、Z轴的旋转矩阵
-        R_x = np.array([
-            [1, 0, 0],
-            [0, np.cos(angle_x), -np.sin(angle_x)],
-            [0, np.sin(angle_x), np.cos(angle_x)]
-        ])
-
-        R_y = np.array([
-            [np.cos(angle_y), 0, np.sin(angle_y)],
-            [0, 1, 0],
-            [-np.sin(angle_y), 0, np.cos(angle_y)]
-        ])
-
-        R_z = np.array([
-            [np.cos(angle_z), -np.sin(angle_z), 0],
-            [np.sin(angle_z), np.cos(angle_z), 0],
-            [0, 0, 1]
-        ])
-
-        # 组合旋转矩阵
-        R = R_x @ R_y @ R_z
-        R = R.transpose()
+        # 组合旋转矩阵，相同角度的矩阵只计算一次
+        R = euler_rotation(angle_x, angle_y, angle_z)
 
         # 原始点向量
         original_vector = np.array([x, y, z])
@@ -3081,33 +4665,8 @@ class MainWindow(QMainWindow):
     def rotate_coordinate_plus(self, x, y, z, angle_x, angle_y, angle_z, reverse_turn=False):
         """旋转坐标点"""
 
-        # 将角度从度转换为弧度
-        angle_x = np.radians(angle_x)
-        angle_y = np.radians(angle_y)
-        angle_z = np.radians(angle_z)
-
-        # 绕X、Y、Z轴的旋转矩阵
-        R_x = np.array([
-            [1, 0, 0],
-            [0, np.cos(angle_x), -np.sin(angle_x)],
-            [0, np.sin(angle_x), np.cos(angle_x)]
-        ])
-
-        R_y = np.array([
-            [np.cos(angle_y), 0, np.sin(angle_y)],
-            [0, 1, 0],
-            [-np.sin(angle_y), 0, np.cos(angle_y)]
-        ])
-
-        R_z = np.array([
-            [np.cos(angle_z), -np.sin(angle_z), 0],
-            [np.sin(angle_z), np.cos(angle_z), 0],
-            [0, 0, 1]
-        ])
-
-        # 组合旋转矩阵
-        R = R_x @ R_y @ R_z
-        R = R.transpose()
+        # 组合旋转矩阵，相同角度的矩阵只计算一次
+        R = euler_rotation(angle_x, angle_y, angle_z)
 
         # 原始点向量
         original_vector = np.array([x, y, z])
@@ -3168,7 +4727,7 @@ class MainWindow(QMainWindow):
             self.safe_add_actor(self.xz_plane_3d_actor)
             self.coords_plane_display = True
 
-        self.render_window_3d.Render()
+        self.render_scheduler.request(self.render_window_3d)
 
     # 辅助方法：安全添加/移除 Actor
     def safe_remove_actor(self, actor):
@@ -3364,6 +4923,7 @@ class MainWindow(QMainWindow):
 
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # 打包后的解码子进程从这里进入
     app = QApplication(sys.argv)
     window = MainWindow()
     window.show()